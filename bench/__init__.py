@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+# benchmarks for Quantum Core Server FULL (run offline against a local instance)
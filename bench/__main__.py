@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Quantum Core benchmark suite.
+
+    python -m bench run [--only routes layers fanout] [--url URL] [--out results.json]
+    python -m bench compare baseline.json candidate.json
+
+`run` starts a local server (gunicorn, current QC_ASYNC_MODE, broadcast
+window 0), measures HTTP routes and SocketIO fan-out against it, runs the
+layer benchmarks in-process, and writes one JSON document tagged with the
+git commit so results from different commits can be compared. With
+--url the HTTP and fan-out suites target an already running instance
+instead; `--only layers` needs no server at all.
+"""
+import os, sys, json, time, asyncio, argparse, platform, subprocess
+from .common import ROOT, free_port, start_server, stop_server, write_results
+
+SUITES = ("routes", "layers", "fanout")
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    results = {"benchmark": "suite", "commit": _git_commit(), "python": platform.python_version(),
+               "platform": platform.platform(), "cpus": os.cpu_count(),
+               "async_mode": os.environ.get("QC_ASYNC_MODE", "threading"),
+               "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    if "layers" in args.only:
+        from .layers import measure_layers
+        results["layers"] = measure_layers(args.layer_iterations, args.serial)
+    if "routes" in args.only or "fanout" in args.only:
+        proc, url = None, args.url
+        if url is None:
+            port = free_port()
+            proc = start_server(port, {"SYNC_BROADCAST_WINDOW_MS": "0", "QC_LOG_LEVEL": "WARNING"})
+            url = f"http://127.0.0.1:{port}"
+        results["target"] = url
+        try:
+            if "routes" in args.only:
+                from .http_routes import measure_routes
+                results["routes"] = asyncio.run(measure_routes(url, args.requests, args.concurrency))
+            if "fanout" in args.only:
+                from .fanout import measure_fanout
+                results["fanout"] = asyncio.run(measure_fanout(url, args.clients, args.emits))
+        finally:
+            if proc is not None:
+                stop_server(proc)
+    write_results(results, args.out)
+
+
+def _flatten(doc):
+    """Map "suite/name/stat" -> number for the stats worth comparing."""
+    flat = {}
+    for name, stats in (doc.get("layers") or {}).items():
+        for stat in ("p50", "p99"):
+            if stat in stats:
+                flat[f"layers/{name}/{stat}_ms"] = stats[stat]
+    for route in doc.get("routes") or []:
+        flat[f"routes/{route['route']}/rps"] = route["rps"]
+        for stat in ("p50", "p99"):
+            if stat in route["latency_ms"]:
+                flat[f"routes/{route['route']}/{stat}_ms"] = route["latency_ms"][stat]
+    fanout = doc.get("fanout") or {}
+    for stat in ("p50", "p99"):
+        if stat in fanout.get("emit_latency_ms", {}):
+            flat[f"fanout/{stat}_ms"] = fanout["emit_latency_ms"][stat]
+    return flat
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        base = _flatten(json.load(f))
+    with open(args.candidate) as f:
+        cand = _flatten(json.load(f))
+    print(f"{'metric':45} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for key in sorted(set(base) & set(cand)):
+        b, c = base[key], cand[key]
+        change = f"{(c - b) / b * 100:+.1f}%" if b else "n/a"
+        print(f"{key:45} {b:12.3f} {c:12.3f} {change:>9}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench", description=__doc__.split("\n\n")[0])
+    sub = ap.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run", help="run the benchmarks and emit JSON")
+    r.add_argument("--only", nargs="+", choices=SUITES, default=list(SUITES))
+    r.add_argument("--requests", type=int, default=2000, help="requests per HTTP route")
+    r.add_argument("--concurrency", type=int, default=16)
+    r.add_argument("--clients", type=int, default=100, help="simulated SocketIO dashboards")
+    r.add_argument("--emits", type=int, default=20)
+    r.add_argument("--layer-iterations", type=int, default=50)
+    r.add_argument("--serial", action="store_true", help="also time the serial 40 x run_layer() reference")
+    r.add_argument("--url", help="benchmark this running instance instead of starting one")
+    r.add_argument("--out", help="write JSON results to this file")
+    c = sub.add_parser("compare", help="compare two result files")
+    c.add_argument("baseline")
+    c.add_argument("candidate")
+    args = ap.parse_args(argv)
+    run(args) if args.command == "run" else compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the benchmarks: start a local server, wait for it,
+read its memory use and summarise latency samples.
+"""
+import os, sys, time, json, socket, subprocess, urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, env=None, gunicorn=True):
+    """Start the server on 127.0.0.1:port and block until /healthz answers."""
+    # every run starts from the built-in state rather than a journal left by an earlier run
+    full_env = dict(os.environ, PORT=str(port), RENDER_EXTERNAL_URL=f"http://127.0.0.1:{port}",
+                    PYTHONUNBUFFERED="1", QC_JOURNAL_DIR="")
+    full_env.update(env or {})
+    if gunicorn:
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}",
+               "quantum_core_server_pro:app"]
+    else:
+        cmd = [sys.executable, "quantum_core_server_pro.py"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=full_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not become healthy within 30s")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def rss_kb(pid):
+    """Resident memory of ``pid`` plus its direct children (gunicorn workers), Linux only."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return total or None
+
+
+def summarize(samples_ms):
+    """Return count/mean/p50/p99/max for latency samples in milliseconds."""
+    if not samples_ms:
+        return {"count": 0}
+    s = sorted(samples_ms)
+
+    def pct(p):
+        return round(s[min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))], 3)
+
+    return {"count": len(s), "mean": round(sum(s) / len(s), 3), "p50": pct(50), "p99": pct(99), "max": round(s[-1], 3)}
+
+
+def write_results(results, out=None):
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if out:
+        with open(out, "w") as f:
+            f.write(text + "\n")
+    print(text)
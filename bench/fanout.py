@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+SocketIO broadcast fan-out: connect N simulated dashboards and measure the
+latency from POST /sync_dashboards to sync_update arriving at every client.
+
+Needs the asyncio SocketIO client: pip install "python-socketio[asyncio_client]"
+"""
+import asyncio, time
+import aiohttp
+import socketio
+from .common import summarize
+
+
+async def _connect(url, received, sem):
+    client = socketio.AsyncClient(reconnection=False)
+
+    @client.on("sync_update")
+    async def on_sync(msg):
+        value = (msg.get("delta") or {}).get("heaven")
+        if value in received:
+            received[value].append(time.perf_counter())
+
+    async with sem:
+        try:
+            # a saturated threading server accepts TCP but never answers, so bound the whole handshake
+            await asyncio.wait_for(client.connect(url, transports=["websocket"], wait_timeout=10), 15)
+            return client
+        except Exception:
+            asyncio.ensure_future(client.disconnect())
+            return None
+
+
+async def measure_fanout(url, clients, emits, connect_concurrency=50, on_connected=None):
+    """Run the fan-out benchmark against a server started with SYNC_BROADCAST_WINDOW_MS=0.
+
+    ``on_connected`` is a coroutine function awaited once every client has
+    connected (e.g. to sample memory); it must not block the event loop.
+    """
+    received = {}
+    sem = asyncio.Semaphore(connect_concurrency)
+    t0 = time.perf_counter()
+    conns = [c for c in await asyncio.gather(*(_connect(url, received, sem) for _ in range(clients))) if c]
+    connect_s = time.perf_counter() - t0
+    extra = await on_connected() if on_connected else {}
+    latencies, emit_errors = [], 0
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as http:
+            for i in range(emits):
+                value = 10_000_000 + i
+                received[value] = []
+                sent = time.perf_counter()
+                try:
+                    async with http.post(f"{url}/sync_dashboards", json={"heaven": value}) as r:
+                        await r.read()
+                except Exception:
+                    emit_errors += 1
+                    received.pop(value)
+                    continue
+                deadline = sent + 10
+                while len(received[value]) < len(conns) and time.perf_counter() < deadline:
+                    await asyncio.sleep(0.005)
+                latencies += [(t - sent) * 1000 for t in received.pop(value)]
+    finally:
+        await asyncio.gather(*(c.disconnect() for c in conns), return_exceptions=True)
+    return dict(extra, clients_requested=clients, connections_held=len(conns),
+                connect_seconds=round(connect_s, 3), emits=emits, emit_errors=emit_errors,
+                deliveries_expected=emits * len(conns), emit_latency_ms=summarize(latencies))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP route throughput and latency against a running server: fixed number of
+requests per route issued by ``concurrency`` parallel asyncio workers.
+"""
+import asyncio, time
+import aiohttp
+from .common import summarize
+
+ROUTES = {
+    "index": ("GET", "/", None),
+    "total_energy_html": ("GET", "/total_energy", None),
+    "total_energy_json": ("GET", "/total_energy?json=1", None),
+    "sync_dashboards": ("POST", "/sync_dashboards", "heaven"),
+}
+
+
+async def _worker(http, method, url, counter, body_key, latencies, errors):
+    while True:
+        i = next(counter, None)
+        if i is None:
+            return
+        kwargs = {"json": {body_key: i}} if body_key else {}
+        t0 = time.perf_counter()
+        try:
+            async with http.request(method, url, **kwargs) as r:
+                await r.read()
+                ok = r.status < 400
+        except Exception:
+            ok = False
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if not ok:
+            errors[0] += 1
+
+
+async def measure_route(base_url, name, requests, concurrency):
+    method, path, body_key = ROUTES[name]
+    latencies, errors = [], [0]
+    counter = iter(range(requests))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as http:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_worker(http, method, base_url + path, counter, body_key, latencies, errors)
+                               for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return {"route": name, "method": method, "path": path, "requests": requests, "concurrency": concurrency,
+            "errors": errors[0], "seconds": round(elapsed, 3), "rps": round(requests / elapsed, 1),
+            "latency_ms": summarize(latencies)}
+
+
+async def measure_routes(base_url, requests, concurrency, names=tuple(ROUTES)):
+    return [await measure_route(base_url, name, requests, concurrency) for name in names]
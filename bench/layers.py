@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+In-process layer benchmarks: full 40-layer sweep through the engine, the
+vectorized table batch on its own, the batch encoded to JSON as a client
+receives it, and (optionally) the serial
+one-layer-at-a-time reference that the engine replaces.
+"""
+import time
+from core import fast_json, layer_engine, layer_model
+from .common import summarize
+
+
+def _timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize(samples)
+
+
+def measure_layers(iterations=50, serial=False):
+    results = {
+        "sweep": _timed(layer_engine.run_layers, iterations),
+        "batch_no_delay": _timed(lambda: layer_model.run_batch(delay=0), iterations * 20),
+        "batch_json": _timed(lambda: fast_json.dumps_bytes(layer_model.run_batch(delay=0)), iterations * 20),
+    }
+    if serial:
+        results["serial_reference"] = _timed(
+            lambda: [layer_model.run_layer(n) for n in range(1, layer_model.LAYER_COUNT + 1)], 2)
+    return results
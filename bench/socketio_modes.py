@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Compare QC_ASYNC_MODE server modes: how many dashboard sockets one
+instance holds, its memory while holding them, and p50/p99 latency from
+POST /sync_dashboards to sync_update arriving at every client.
+
+    python -m bench.socketio_modes --modes threading gevent eventlet --clients 1000
+
+Needs the asyncio SocketIO client: pip install "python-socketio[asyncio_client]"
+"""
+import argparse, asyncio
+from .common import free_port, start_server, stop_server, rss_kb, write_results
+from .fanout import measure_fanout
+
+
+async def run_mode(mode, clients, emits, connect_concurrency):
+    port = free_port()
+    proc = start_server(port, {"QC_ASYNC_MODE": mode, "SYNC_BROADCAST_WINDOW_MS": "0",
+                               "LAYER_SAMPLE_INTERVAL": "3600"})
+    try:
+        rss_idle = rss_kb(proc.pid)
+
+        async def held():
+            # let the server settle while the clients keep answering pings
+            await asyncio.sleep(1)
+            return {"rss_kb_idle": rss_idle, "rss_kb_held": rss_kb(proc.pid)}
+
+        result = await measure_fanout(f"http://127.0.0.1:{port}", clients, emits, connect_concurrency, held)
+        return dict(result, mode=mode)
+    finally:
+        stop_server(proc)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--modes", nargs="+", default=["threading", "gevent", "eventlet"])
+    ap.add_argument("--clients", type=int, default=500)
+    ap.add_argument("--emits", type=int, default=20)
+    ap.add_argument("--connect-concurrency", type=int, default=50)
+    ap.add_argument("--out", help="write JSON results to this file")
+    args = ap.parse_args(argv)
+    results = []
+    for mode in args.modes:
+        try:
+            results.append(asyncio.run(run_mode(mode, args.clients, args.emits, args.connect_concurrency)))
+        except Exception as e:
+            results.append({"mode": mode, "error": repr(e)})
+    write_results({"benchmark": "socketio_modes", "results": results}, args.out)
+
+
+if __name__ == "__main__":
+    main()
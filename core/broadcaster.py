@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+📡 Coalescing Broadcaster
+Collects versioned deltas published by request handlers and emits at most
+one message per event per window from a background task, so handlers
+never wait on fan-out.
+
+Wire format (both sync_update and quantum_sync):
+  delta: {"version": v, "base": b, "delta": {changed keys}}
+  full:  {"version": v, "full": true, "data": {all keys}}
+A client applies a delta only when ``base`` equals the version it holds;
+otherwise it emits "resync" and receives a full message.
+"""
+import os, time, threading
+from . import metrics
+from .log import get_logger
+
+log = get_logger("broadcast")
+EMIT_SECONDS = metrics.histogram("qc_socketio_emit_duration_seconds", "Time spent in socketio.emit fan-out", ("event",))
+BROADCAST_WINDOW = float(os.environ.get("SYNC_BROADCAST_WINDOW_MS", 100)) / 1000.0
+
+
+def full_message(version, data):
+    return {"version": version, "full": True, "data": data}
+
+
+class Broadcaster:
+    def __init__(self, socketio, window=BROADCAST_WINDOW):
+        self.socketio = socketio
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wake = threading.Event()
+        self._task = None
+
+    def publish(self, event, version, delta):
+        """Queue the keys that changed to reach ``version`` (from ``version - 1``).
+
+        Deltas published within one window are merged into a single message
+        spanning base..version; per-key versions keep the newest value even
+        if writers publish out of order.
+        """
+        with self._lock:
+            entry = self._pending.get(event)
+            if entry is None:
+                entry = self._pending[event] = {"base": version - 1, "version": version, "delta": {}, "kv": {}}
+            else:
+                entry["base"] = min(entry["base"], version - 1)
+                entry["version"] = max(entry["version"], version)
+            kv, merged = entry["kv"], entry["delta"]
+            for key, value in delta.items():
+                if kv.get(key, -1) < version:
+                    merged[key] = value
+                    kv[key] = version
+            if self._task is None:
+                self._task = self.socketio.start_background_task(self._run)
+        self._wake.set()
+
+    def flush(self):
+        """Emit everything pending right now; returns the number of events sent."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for event, entry in pending.items():
+            t0 = time.monotonic()
+            try:
+                self.socketio.emit(event, {"version": entry["version"], "base": entry["base"], "delta": entry["delta"]})
+                EMIT_SECONDS.labels(event).observe(time.monotonic() - t0)
+            except Exception as e:
+                log.error("Broadcast thất bại", extra={"event": "BROADCAST", "fields": {"socket_event": event, "error": repr(e)}})
+        return len(pending)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # let the burst accumulate, then send one message per event
+            self.socketio.sleep(self.window)
+            self.flush()
@@ -1,23 +1,124 @@
 # -*- coding: utf-8 -*-
-import os, time, threading
-def start_watcher(path="core", interval=3, on_change=None):
-    seen = {}
-    while True:
+"""
+🔁 Core Auto Reload
+Watches core/ for changed .py files and calls on_change(filename) once per
+file after a burst of writes has settled. Uses inotify (via ctypes) on
+Linux, the optional watchdog package elsewhere, and mtime polling as the
+last resort. Select a backend with CORE_WATCH_BACKEND=auto|inotify|watchdog|poll.
+"""
+import os, time, queue, select, struct, threading, ctypes, ctypes.util
+from .log import get_logger
+
+log = get_logger("reload")
+
+WATCH_BACKEND = os.environ.get("CORE_WATCH_BACKEND", "auto")
+DEBOUNCE = float(os.environ.get("CORE_RELOAD_DEBOUNCE", 0.2))
+
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+def _inotify_feed(path, events):
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    fd = libc.inotify_init1(IN_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+        os.close(fd)
+        raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+
+    def reader():
+        while True:
+            # select first so cooperative servers (gevent/eventlet) can yield here
+            select.select([fd], [], [])
+            buf = os.read(fd, 64 * 1024)
+            pos = 0
+            while pos < len(buf):
+                _, _, _, length = _EVENT.unpack_from(buf, pos)
+                name = buf[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+                pos += _EVENT.size + length
+                if name:
+                    events.put(os.fsdecode(name))
+
+    threading.Thread(target=reader, name="core-inotify", daemon=True).start()
+
+
+def _watchdog_feed(path, events):
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if not event.is_directory:
+                for p in (event.src_path, getattr(event, "dest_path", "")):
+                    if p:
+                        events.put(os.path.basename(p))
+
+    observer = Observer()
+    observer.schedule(Handler(), path, recursive=False)
+    observer.daemon = True
+    observer.start()
+
+
+def _poll_feed(path, events, interval):
+    def scan():
         try:
-            files = [f for f in os.listdir(path) if f.endswith(".py")]
+            return {f: os.path.getmtime(os.path.join(path, f)) for f in os.listdir(path)}
         except FileNotFoundError:
-            files = []
-        changed = []
-        for fn in files:
-            p = os.path.join(path, fn)
-            ts = os.path.getmtime(p)
-            if fn not in seen or seen[fn] != ts:
-                seen[fn] = ts
-                changed.append(fn)
-        if changed and on_change:
-            for c in changed:
-                try:
-                    on_change(c)
-                except Exception:
-                    pass
-        time.sleep(interval)
+            return {}
+
+    def poller():
+        seen = scan()
+        while True:
+            time.sleep(interval)
+            current = scan()
+            for fn in set(seen) | set(current):
+                if seen.get(fn) != current.get(fn):
+                    events.put(fn)
+            seen = current
+
+    threading.Thread(target=poller, name="core-poll", daemon=True).start()
+
+
+def _start_feed(path, events, interval, backend):
+    backends = ["inotify", "watchdog", "poll"] if backend == "auto" else [backend]
+    for name in backends:
+        try:
+            if name == "inotify":
+                _inotify_feed(path, events)
+            elif name == "watchdog":
+                _watchdog_feed(path, events)
+            else:
+                _poll_feed(path, events, interval)
+            return name
+        except (ImportError, OSError, AttributeError) as e:
+            log.warning("%s watcher unavailable: %s", name, e, extra={"event": "RELOAD"})
+    _poll_feed(path, events, interval)
+    return "poll"
+
+
+def start_watcher(path="core", interval=3, on_change=None, debounce=DEBOUNCE, backend=WATCH_BACKEND):
+    """Block forever, dispatching debounced .py changes in ``path`` to on_change."""
+    events = queue.Queue()
+    used = _start_feed(path, events, interval, backend)
+    log.info("Watching %s with %s backend", path, used, extra={"event": "RELOAD"})
+    while True:
+        changed = {events.get()}
+        while True:
+            try:
+                changed.add(events.get(timeout=debounce))
+            except queue.Empty:
+                break
+        if not on_change:
+            continue
+        for fn in sorted(c for c in changed if c.endswith(".py")):
+            try:
+                on_change(fn)
+            except Exception:
+                log.exception("Reload of %s failed", fn, extra={"event": "RELOAD"})
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+🔋 Energy State Store
+Holds the heaven/earth/human energy as an immutable snapshot plus a
+monotonically increasing version. Writers copy-on-write under a lock;
+readers grab the current (version, snapshot) pair without locking.
+"""
+import threading, datetime
+
+
+class FrozenDict(dict):
+    """dict that refuses mutation, so a published snapshot can be shared freely."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("energy snapshot is read-only")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def merge_updates(current, updates):
+    """Apply ``updates`` in order to a copy of ``current``.
+
+    Returns (new, changed) where ``changed`` is the net change against
+    ``current``; last_update is refreshed only when something changed.
+    """
+    new = dict(current)
+    for data in updates:
+        new.update((k, v) for k, v in data.items() if k != "last_update")
+    changed = {k: v for k, v in new.items()
+               if k != "last_update" and (k not in current or current[k] != v)}
+    if changed:
+        new["last_update"] = str(datetime.datetime.now())
+    return new, changed
+
+
+class EnergyStore:
+    def __init__(self, initial, version=0):
+        self._lock = threading.Lock()
+        # one attribute holding both values: a single read is always consistent
+        self._state = (version, FrozenDict(initial))
+
+    def read(self):
+        """Return the current (version, snapshot) pair."""
+        return self._state
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    @property
+    def snapshot(self):
+        return self._state[1]
+
+    def update(self, data):
+        """Apply the keys of ``data`` that actually differ.
+
+        Returns (version, snapshot, changed). When nothing changed the
+        version and last_update stay as they were and ``changed`` is empty.
+        """
+        return self.update_many((data,))
+
+    def update_many(self, updates):
+        """Apply several updates in order inside one critical section.
+
+        The batch is published as a single new version; ``changed`` holds
+        the net effect of the whole batch against the previous snapshot.
+        """
+        with self._lock:
+            version, current = self._state
+            new, changed = merge_updates(current, updates)
+            if not changed:
+                return version, current, changed
+            self._state = (version + 1, FrozenDict(new))
+            return version + 1, self._state[1], changed
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+⚡ Fast JSON
+One JSON codec for HTTP responses, request bodies and SocketIO packets:
+orjson when it is installed, the stdlib json module otherwise. Force one
+with QC_JSON=auto|orjson|json.
+
+Payloads that many clients or requests consume (the full energy state on
+connect, the layer snapshot) are wrapped in Preserialized by an
+EncodedCache, so each version is encoded once and then spliced verbatim
+into every response or packet that carries it. Objects with a to_json()
+method (e.g. LayerReading) are encoded as the value it returns.
+"""
+import os, json
+from flask.json.provider import DefaultJSONProvider
+
+JSON_BACKEND = os.environ.get("QC_JSON", "auto")
+
+orjson = None
+if JSON_BACKEND in ("auto", "orjson"):
+    try:
+        import orjson
+    except ImportError:
+        if JSON_BACKEND == "orjson":
+            raise
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+class Preserialized:
+    """A JSON value together with its encoding, computed once."""
+    __slots__ = ("value", "encoded")
+
+    def __init__(self, value):
+        self.value = value
+        self.encoded = _encode(value)
+
+    def __reduce__(self):
+        # pickling message queues (e.g. Redis) receive the plain value
+        return (_identity, (self.value,))
+
+
+def _identity(value):
+    return value
+
+
+def _hook(default):
+    def hook(o):
+        if isinstance(o, Preserialized):
+            return o.value
+        if hasattr(o, "to_json"):
+            return o.to_json()
+        if default is not None:
+            return default(o)
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+    return hook
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def _encode(obj, default=None):
+        return orjson.dumps(obj, default=_hook(default), option=_OPTIONS)
+
+    _loads = orjson.loads
+else:
+    def _encode(obj, default=None):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_hook(default)).encode("utf-8")
+
+    _loads = json.loads
+
+
+def dumps_bytes(obj, default=None):
+    """Encode ``obj`` as compact UTF-8 JSON, splicing in Preserialized values.
+
+    Top-level Preserialized values and those directly inside a top-level
+    list (the shape of a SocketIO event packet) are copied, not re-encoded.
+    """
+    if isinstance(obj, Preserialized):
+        return obj.encoded
+    if isinstance(obj, (list, tuple)) and any(isinstance(item, Preserialized) for item in obj):
+        return b"[" + b",".join(dumps_bytes(item, default) for item in obj) + b"]"
+    return _encode(obj, default)
+
+
+def dumps(obj, **kwargs):
+    """json.dumps-compatible entry point (formatting keyword arguments are ignored)."""
+    return dumps_bytes(obj, kwargs.get("default")).decode("utf-8")
+
+
+def loads(s, **kwargs):
+    return _loads(s)
+
+
+class EncodedCache:
+    """Per-key (version, Preserialized) cache: each version is encoded once."""
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key, version, build):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            # concurrent misses may both encode; the result is identical either way
+            entry = self._entries[key] = (version, Preserialized(build()))
+        return entry[1]
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps_bytes/loads; keeps Flask's default() for dates, UUIDs, dataclasses."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj, kwargs.get("default", self.default)).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return _loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, self.default) + b"\n", mimetype=self.mimetype)
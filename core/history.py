@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+📜 History Ring Buffers
+Fixed-capacity time series for heaven/earth/human and for every layer's
+energy and resonance. Each ring is one flat float64 buffer laid out column
+by column (timestamps first), so appending writes a few floats in place and
+a query slices one column without building a dict per sample. With a
+prefix the buffers are mmap'd files that every worker appends to and reads.
+
+Metric names: heaven, earth, human, layer_07.energy, layer_07.resonance.
+"""
+import os, math, mmap, fcntl, struct, threading
+from contextlib import contextmanager
+from .layer_model import LAYER_COUNT
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+HISTORY_CAPACITY = int(os.environ.get("QC_HISTORY_CAPACITY", 8640))
+
+ENERGY_METRICS = ("heaven", "earth", "human")
+LAYER_METRICS = tuple(f"layer_{n:02d}.{field}" for n in range(1, LAYER_COUNT + 1) for field in ("energy", "resonance"))
+
+# header: samples ever appended, newest version recorded
+HEAD = struct.Struct("<QQ")
+NAN = float("nan")
+
+
+def _num(v):
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else NAN
+
+
+class RingBuffer:
+    def __init__(self, columns, capacity=HISTORY_CAPACITY, path=None):
+        self.columns = tuple(columns)
+        self.index = {c: i + 1 for i, c in enumerate(self.columns)}
+        self.capacity = capacity
+        size = HEAD.size + 8 * capacity * (len(self.columns) + 1)
+        self.path = path
+        if path is None:
+            self.buf = bytearray(size)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                st = os.fstat(fd)
+                if st.st_size != size:
+                    # new file or a different layout/capacity: start empty
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                self.buf = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        self.data = memoryview(self.buf)[HEAD.size:].cast("d")
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        if self.path is None:
+            with self._thread_lock:
+                yield
+            return
+        with self._thread_lock, open(self.path + ".lock", "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return min(HEAD.unpack_from(self.buf, 0)[0], self.capacity)
+
+    def append(self, ts, values, version=None):
+        """Append one row (values in column order); rows older than the newest recorded version are dropped."""
+        with self._locked():
+            count, last = HEAD.unpack_from(self.buf, 0)
+            if version is not None and count and version <= last:
+                return False
+            cap, data, i = self.capacity, self.data, count % self.capacity
+            data[i] = ts
+            for col, v in enumerate(values, 1):
+                data[col * cap + i] = v
+            # the count is bumped last, so readers never include a half-written row
+            HEAD.pack_into(self.buf, 0, count + 1, last if version is None else version)
+        return True
+
+    def clear_if_ahead(self, version):
+        """Forget rows recorded past ``version`` (a ring file left over from an earlier state)."""
+        with self._locked():
+            count, last = HEAD.unpack_from(self.buf, 0)
+            if count and last > version:
+                HEAD.pack_into(self.buf, 0, 0, 0)
+
+    def _order(self):
+        """Slice bounds (start, end) of the live rows in chronological order, as 1 or 2 ranges."""
+        count = HEAD.unpack_from(self.buf, 0)[0]
+        if count <= self.capacity:
+            return [(0, count)]
+        # the oldest row is the next to be overwritten by a concurrent append; skip it
+        head = count % self.capacity
+        return [(r0, r1) for r0, r1 in ((head + 1, self.capacity), (0, head)) if r1 > r0]
+
+    def query(self, column, since=None, until=None, step=None):
+        """Return (timestamps, values) for ``column``, optionally averaged into ``step``-second buckets."""
+        col = self.index[column] * self.capacity
+        ranges = self._order()
+        if np is not None:
+            return self._query_np(col, ranges, since, until, step)
+        ts = [t for r0, r1 in ranges for t in self.data[r0:r1]]
+        vs = [v for r0, r1 in ranges for v in self.data[col + r0:col + r1]]
+        lo = 0 if since is None else next((i for i, t in enumerate(ts) if t >= since), len(ts))
+        hi = len(ts) if until is None else next((i for i, t in enumerate(ts) if t > until), len(ts))
+        ts, vs = ts[lo:hi], vs[lo:hi]
+        if step:
+            buckets = {}
+            for t, v in zip(ts, vs):
+                if not math.isnan(v):
+                    acc = buckets.setdefault(math.floor(t / step), [0.0, 0])
+                    acc[0] += v
+                    acc[1] += 1
+            ts = [b * step for b in buckets]
+            vs = [s / n for s, n in buckets.values()]
+        return ts, [None if math.isnan(v) else v for v in vs]
+
+    def _query_np(self, col, ranges, since, until, step):
+        data = np.frombuffer(self.data, dtype=np.float64)
+        ts = np.concatenate([data[r0:r1] for r0, r1 in ranges])
+        vs = np.concatenate([data[col + r0:col + r1] for r0, r1 in ranges])
+        lo = 0 if since is None else np.searchsorted(ts, since, "left")
+        hi = len(ts) if until is None else np.searchsorted(ts, until, "right")
+        ts, vs = ts[lo:hi], vs[lo:hi]
+        if step and len(ts):
+            keep = ~np.isnan(vs)
+            ts, vs = ts[keep], vs[keep]
+            buckets = np.floor(ts / step)
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]]) if len(ts) else np.array([], int)
+            if len(starts):
+                counts = np.diff(np.r_[starts, len(ts)])
+                vs = np.add.reduceat(vs, starts) / counts
+                ts = buckets[starts] * step
+        out = vs.tolist()
+        if np.isnan(vs).any():
+            out = [None if v != v else v for v in out]
+        return ts.tolist(), out
+
+
+class History:
+    """Energy and layer rings plus the metric-name lookup used by /history."""
+
+    def __init__(self, capacity=HISTORY_CAPACITY, prefix=None):
+        def path(name):
+            return None if prefix is None else f"{prefix}-history-{name}.ring"
+
+        self.energy = RingBuffer(ENERGY_METRICS, capacity, path("energy"))
+        self.layers = RingBuffer(LAYER_METRICS, capacity, path("layers"))
+
+    def record_energy(self, version, data, ts):
+        return self.energy.append(ts, [_num(data.get(k)) for k in ENERGY_METRICS], version)
+
+    def record_layers(self, version, layers, ts):
+        row = [NAN] * len(LAYER_METRICS)
+        for r in layers:
+            n = r.layer
+            if 1 <= n <= LAYER_COUNT:
+                row[2 * n - 2] = _num(r.energy)
+                row[2 * n - 1] = _num(r.resonance)
+        return self.layers.append(ts, row, version)
+
+    def metrics(self):
+        return ENERGY_METRICS + LAYER_METRICS
+
+    def query(self, metric, since=None, until=None, step=None):
+        """Return {"metric", "t", "v"}; raises KeyError for an unknown metric."""
+        ring = self.energy if metric in self.energy.index else self.layers
+        ts, vs = ring.query(metric, since, until, step)
+        return {"metric": metric, "step": step, "count": len(ts), "t": ts, "v": vs}
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+🧾 State Journal
+Append-only binary log of energy updates and layer sweeps, split into
+segments and periodically compacted into a snapshot, so a restart loads
+the latest snapshot and replays only the records written after it.
+
+Request threads only enqueue; one writer thread encodes, appends, fsyncs at
+most every QC_JOURNAL_FSYNC_MS and writes a snapshot every
+QC_JOURNAL_SNAPSHOT_SECONDS (or QC_JOURNAL_SNAPSHOT_RECORDS records).
+
+Record: <length u32><crc32 u32><kind u8><seq u64><ts f64> + payload
+  energy: JSON {"v": version, "d": changed keys, "t": last_update}
+  layers: <version u64><sampled_ts f64><sweep_ms f64><count u32> + count x <layer u16><energy f64><resonance f64><state u8>
+"""
+import os, glob, time, queue, struct, atexit, threading, datetime, zlib
+from . import fast_json
+from .layer_model import UNKNOWN, LayerReading
+from .log import get_logger
+
+log = get_logger("journal")
+
+FSYNC_INTERVAL = float(os.environ.get("QC_JOURNAL_FSYNC_MS", 200)) / 1000.0
+SNAPSHOT_SECONDS = float(os.environ.get("QC_JOURNAL_SNAPSHOT_SECONDS", 60))
+SNAPSHOT_RECORDS = int(os.environ.get("QC_JOURNAL_SNAPSHOT_RECORDS", 10000))
+
+RECORD = struct.Struct("<IIBQd")
+ENERGY, LAYERS = 1, 2
+SWEEP = struct.Struct("<QddI")
+READING = struct.Struct("<HddB")
+# states are stored as the fixed layer_model codes; override-defined ones (process-local codes) as UNKNOWN
+NAN = float("nan")
+_STOP = object()
+
+
+def _encode_layers(version, layers, sampled_ts, sweep_ms):
+    parts = [SWEEP.pack(version, sampled_ts, sweep_ms, len(layers))]
+    for r in layers:
+        parts.append(READING.pack(r.layer, NAN if r.energy is None else r.energy,
+                                  NAN if r.resonance is None else r.resonance,
+                                  min(r.state, UNKNOWN)))
+    return b"".join(parts)
+
+
+def _decode_layers(payload):
+    version, sampled_ts, sweep_ms, count = SWEEP.unpack_from(payload, 0)
+    # readings keep the sweep time only; per-reading timestamps are not journaled
+    ts_ns = int(sampled_ts * 1e6) * 1000
+    layers = [LayerReading(layer, None if energy != energy else energy, None if resonance != resonance else resonance,
+                           min(state, UNKNOWN), ts_ns)
+              for layer, energy, resonance, state
+              in READING.iter_unpack(memoryview(payload)[SWEEP.size:SWEEP.size + count * READING.size])]
+    return {"version": version, "layers": layers, "sampled_at": str(datetime.datetime.fromtimestamp(sampled_ts)),
+            "sampled_ts": sampled_ts, "sweep_ms": sweep_ms}
+
+
+def _read_records(path):
+    """Yield (kind, seq, ts, payload, end offset) up to the first truncated or corrupt record."""
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + RECORD.size <= len(data):
+        length, crc, kind, seq, ts = RECORD.unpack_from(data, pos)
+        body = data[pos + 8:pos + RECORD.size + length]
+        if len(body) != RECORD.size - 8 + length or zlib.crc32(body) != crc:
+            # torn tail from a crash mid-write; everything before it is intact
+            break
+        pos += RECORD.size + length
+        yield kind, seq, ts, data[pos - length:pos], pos
+
+
+class Journal:
+    def __init__(self, directory, fsync_interval=FSYNC_INTERVAL, snapshot_seconds=SNAPSHOT_SECONDS,
+                 snapshot_records=SNAPSHOT_RECORDS):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.fsync_interval = fsync_interval
+        self.snapshot_seconds = snapshot_seconds
+        self.snapshot_records = snapshot_records
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+        self.seq = 0
+        # the writer's own copy of the state, used to write snapshots without touching the live stores
+        self.energy_version, self.energy = 0, {}
+        self.layers = None
+        self._key_versions = {}
+
+    # ---- state folding (shared by replay and the writer) --------------
+    def _apply(self, kind, payload):
+        if kind == ENERGY:
+            doc = fast_json.loads(payload)
+            version = doc["v"]
+            for key, value in doc["d"].items():
+                # request threads may enqueue out of order; keep the newest value per key
+                if version >= self._key_versions.get(key, 0):
+                    self.energy[key] = value
+                    self._key_versions[key] = version
+            if version >= self.energy_version:
+                self.energy_version = version
+                self.energy["last_update"] = doc["t"]
+        elif kind == LAYERS:
+            snap = _decode_layers(payload)
+            if self.layers is None or snap["version"] >= self.layers["version"]:
+                self.layers = snap
+
+    # ---- recovery ----------------------------------------------------
+    def recover(self, initial_energy):
+        """Load the newest snapshot and replay later records.
+
+        Returns {"energy": (version, data), "layers": snapshot or None,
+        "replayed": records, "seconds": elapsed}.
+        """
+        t0 = time.monotonic()
+        self.energy = dict(initial_energy)
+        for path in sorted(glob.glob(os.path.join(self.directory, "snapshot-*.json")), reverse=True):
+            try:
+                with open(path, "rb") as f:
+                    snap = fast_json.loads(f.read())
+            except (OSError, ValueError):
+                log.warning("Bỏ qua snapshot hỏng %s", path, extra={"event": "JOURNAL"})
+                continue
+            self.seq = snap["seq"]
+            self.energy_version, self.energy = snap["energy"]["version"], snap["energy"]["data"]
+            # older snapshots carry no per-key versions; none of their keys is older than the snapshot
+            self._key_versions = snap["energy"].get("keys") or dict.fromkeys(self.energy, self.energy_version)
+            layers = snap["layers"]
+            self.layers = layers and dict(layers, layers=[LayerReading.from_dict(r) for r in layers["layers"]])
+            break
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, "segment-*.log"))):
+            end = 0
+            for kind, seq, ts, payload, end in _read_records(path):
+                if seq <= self.seq:
+                    continue
+                self._apply(kind, payload)
+                self.seq = seq
+                replayed += 1
+            if end < os.path.getsize(path):
+                # cut the torn tail, or records appended after it would be unreachable on the next recovery
+                log.warning("Cắt bản ghi hỏng cuối %s", path, extra={"event": "JOURNAL", "fields": {"offset": end}})
+                os.truncate(path, end)
+        elapsed = time.monotonic() - t0
+        log.info("Khôi phục trạng thái từ journal", extra={"event": "JOURNAL", "fields": {
+            "seq": self.seq, "energy_version": self.energy_version, "replayed": replayed,
+            "ms": round(elapsed * 1000, 2)}})
+        return {"energy": (self.energy_version, dict(self.energy)), "layers": self.layers,
+                "replayed": replayed, "seconds": elapsed}
+
+    # ---- producer side (request / sampler threads) ---------------------
+    def append_energy(self, version, changed, last_update):
+        self._queue.put((ENERGY, (version, changed, last_update)))
+
+    def append_layers(self, version, layers, sampled_ts, sweep_ms):
+        self._queue.put((LAYERS, (version, layers, sampled_ts, sweep_ms)))
+
+    # ---- writer thread -----------------------------------------------
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(os.path.join(self.directory, f"segment-{self.seq + 1:016x}.log"), "ab")
+
+    def _write(self, kind, args):
+        if kind == ENERGY:
+            version, changed, last_update = args
+            payload = fast_json.dumps_bytes({"v": version, "d": changed, "t": last_update})
+        else:
+            payload = _encode_layers(*args)
+        self.seq += 1
+        body = RECORD.pack(len(payload), 0, kind, self.seq, time.time())[8:] + payload
+        self._file.write(struct.pack("<II", len(payload), zlib.crc32(body)) + body)
+        self._apply(kind, payload)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def snapshot(self):
+        """Write a compacted snapshot of everything logged so far and drop the segments it covers."""
+        self._sync()
+        doc = {"seq": self.seq, "energy": {"version": self.energy_version, "data": self.energy,
+                                           "keys": self._key_versions},
+               "layers": self.layers}
+        path = os.path.join(self.directory, f"snapshot-{self.seq:016x}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(fast_json.dumps_bytes(doc))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        old = [p for p in glob.glob(os.path.join(self.directory, "snapshot-*.json")) if p != path]
+        old += glob.glob(os.path.join(self.directory, "segment-*.log"))
+        self._open_segment()
+        for p in old:
+            os.unlink(p)
+
+    def _run(self):
+        synced = snapshotted = time.monotonic()
+        dirty = since_snapshot = 0
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in batch)
+            for item in batch:
+                if item is not _STOP:
+                    try:
+                        self._write(*item)
+                        dirty += 1
+                    except Exception:
+                        log.exception("Ghi journal thất bại", extra={"event": "JOURNAL"})
+            now = time.monotonic()
+            if dirty and (stop or now - synced >= self.fsync_interval):
+                self._sync()
+                since_snapshot += dirty
+                dirty, synced = 0, now
+            if since_snapshot and (stop or since_snapshot >= self.snapshot_records
+                                   or now - snapshotted >= self.snapshot_seconds):
+                self.snapshot()
+                since_snapshot, snapshotted = 0, now
+            if stop:
+                return
+
+    def start(self):
+        if self._thread is None:
+            self._open_segment()
+            self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def close(self, timeout=5):
+        """Flush, fsync and snapshot whatever is queued, then stop the writer."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
@@ -1,23 +0,0 @@
-# -*- coding: utf-8 -*-
-"""
-🎵 Quantum Resonance Matrix
-Auto-generated layer module for Quantum Core FULL pack.
-"""
-import random, time
-from datetime import datetime
-def run_layer():
-    # short delay to simulate measurement time
-    time.sleep(0.04)
-    energy = round(random.uniform(4.70,4.90),4)
-    resonance = round(random.uniform(0.88,0.99),4)
-    if resonance > 0.95:
-        state = "Harmonized"
-    elif resonance > 0.90:
-        state = "Stable"
-    elif resonance > 0.86:
-        state = "Resonant"
-    else:
-        state = "Fluctuating"
-    return {"layer":4,"energy":energy,"resonance":resonance,"state":state,"timestamp":datetime.utcnow().isoformat()}
-if __name__ == "__main__":
-    print(run_layer())
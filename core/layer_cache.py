@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+🗃️ Layer Result Cache
+Keeps the latest reading of each layer for a per-layer TTL so callers that
+can live with a slightly old reading do not pay for run_layer() again.
+Concurrent misses on the same layer share one in-flight call (single
+flight), and invalidate() drops a layer when its override is reloaded.
+
+  LAYER_CACHE_TTL   default TTL in seconds (1.0)
+  LAYER_CACHE_TTLS  per-layer TTLs, e.g. "07=5,12=0.2"
+An override module can also set CACHE_TTL = seconds.
+"""
+import os, time, threading
+from concurrent.futures import Future
+from . import metrics
+
+CACHE_REQUESTS = metrics.counter("qc_layer_cache_requests_total", "Layer cache lookups by outcome (hit, miss, shared)", ("result",))
+
+LAYER_CACHE_TTL = float(os.environ.get("LAYER_CACHE_TTL", 1.0))
+
+
+def parse_ttls(spec):
+    ttls = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        num, _, ttl = part.partition("=")
+        ttls[int(num)] = float(ttl)
+    return ttls
+
+
+LAYER_CACHE_TTLS = parse_ttls(os.environ.get("LAYER_CACHE_TTLS", ""))
+
+
+class LayerCache:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}    # num -> (measured_at, reading)
+        self._inflight = {}   # num -> Future of the call every concurrent miss waits on
+        self._generation = {}
+
+    def get(self, num, compute, ttl=LAYER_CACHE_TTL):
+        """Return a reading for ``num`` younger than ``ttl``, calling compute() at most once at a time."""
+        entry = self._entries.get(num)
+        if entry is not None and self.clock() - entry[0] < ttl:
+            CACHE_REQUESTS.labels("hit").inc()
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(num)
+            if entry is not None and self.clock() - entry[0] < ttl:
+                CACHE_REQUESTS.labels("hit").inc()
+                return entry[1]
+            future = self._inflight.get(num)
+            owner = future is None
+            if owner:
+                future = self._inflight[num] = Future()
+                generation = self._generation.get(num, 0)
+        if not owner:
+            CACHE_REQUESTS.labels("shared").inc()
+            return future.result()
+        CACHE_REQUESTS.labels("miss").inc()
+        started = self.clock()
+        try:
+            reading = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(num) is future:
+                    del self._inflight[num]
+        with self._lock:
+            # a reload during the call makes this reading stale: hand it to the waiters, don't keep it
+            if self._generation.get(num, 0) == generation and reading.error is None:
+                self._entries[num] = (started, reading)
+        future.set_result(reading)
+        return reading
+
+    def generations(self):
+        """Snapshot to pass to put() for readings measured from now on."""
+        with self._lock:
+            return dict(self._generation)
+
+    def put(self, reading, measured_at=None, generations=None):
+        """Seed the cache with a reading produced elsewhere (e.g. a full sweep).
+
+        With ``generations`` (taken by generations() when the measurement
+        began) a reading of a layer invalidated since then is dropped.
+        """
+        if reading.error is not None:
+            return
+        with self._lock:
+            if generations is None or self._generation.get(reading.layer, 0) == generations.get(reading.layer, 0):
+                self._entries[reading.layer] = (self.clock() if measured_at is None else measured_at, reading)
+
+    def invalidate(self, num=None):
+        """Forget one layer (or all) so the next get() runs the current code."""
+        with self._lock:
+            nums = list(self._entries.keys() | self._inflight.keys() | self._generation.keys()) if num is None else [num]
+            for n in nums:
+                self._entries.pop(n, None)
+                self._inflight.pop(n, None)
+                self._generation[n] = self._generation.get(n, 0) + 1
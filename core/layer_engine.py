@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+⚙️ Layer Execution Engine
+Measures all layers from the table model in one batch and runs any
+core/layer_XX.py override's run_layer() concurrently on a bounded thread
+pool, returning results in layer order. read_layer() serves single
+layers through the result cache, which every sweep refreshes and every
+reload invalidates. Overrides listed in LAYER_PROCESS_LAYERS run in the
+worker process pool instead of on the thread pool.
+
+Overrides are indexed by filename at startup and imported on first use
+(or by a background warm_up()), so boot never waits on them.
+
+A sweep never waits longer than LAYER_SWEEP_TIMEOUT, queued time included.
+An override whose timed-out call is still holding a thread is not started
+again until that call returns; it reports "Timeout" meanwhile, so a hung
+override costs one pool thread rather than one per sweep.
+"""
+import os, re, sys, time, asyncio, functools, importlib, importlib.util, threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+from . import layer_model, metrics
+from .layer_cache import LAYER_CACHE_TTL, LAYER_CACHE_TTLS, LayerCache
+from .layer_pool import LAYER_PROCESS_LAYERS, LayerProcessPool, parse_layers
+from .log import get_logger
+
+log = get_logger("layers")
+LAYER_SECONDS = metrics.histogram("qc_layer_duration_seconds", "run_layer() execution time of override layers", ("layer",))
+LAYER_TIMEOUTS = metrics.counter("qc_layer_timeouts_total", "Layers reported as Timeout", ("layer",))
+LAYER_ERRORS = metrics.counter("qc_layer_errors_total", "run_layer() calls that raised", ("layer",))
+BATCH_SECONDS = metrics.histogram("qc_layer_batch_duration_seconds", "Vectorized table-model batch time")
+SWEEP_SECONDS = metrics.histogram("qc_layer_sweep_duration_seconds", "Full 40-layer sweep time")
+
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYER_FILE_RE = re.compile(r"^layer_(\d{2})\.py$")
+LAYER_TIMEOUT = float(os.environ.get("LAYER_TIMEOUT", 0.5))
+LAYER_MAX_WORKERS = int(os.environ.get("LAYER_MAX_WORKERS", 40))
+LAYER_SWEEP_TIMEOUT = float(os.environ.get("LAYER_SWEEP_TIMEOUT", 0)) or 4 * LAYER_TIMEOUT
+LAYER_WARMUP = os.environ.get("LAYER_WARMUP", "1") == "1"
+LAYER_WARMUP_DELAY = float(os.environ.get("LAYER_WARMUP_DELAY", 1.0))
+
+_executor = None
+_executor_lock = threading.Lock()
+_layers = None
+_registry_lock = threading.Lock()
+_cache = LayerCache()
+_process_layers = parse_layers(LAYER_PROCESS_LAYERS) if LAYER_PROCESS_LAYERS else set()
+_pool = None
+_pool_lock = threading.Lock()
+_stuck = {}  # layer -> future of a timed-out call still occupying a pool thread
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=LAYER_MAX_WORKERS, thread_name_prefix="layer")
+    return _executor
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = LayerProcessPool(preload=sorted(n for n in get_layers() if _in_process(n)))
+    return _pool
+
+
+def start_pool():
+    """Start the layer process workers now (in the background) if any layer runs in them."""
+    if _process_layers:
+        _get_pool()
+
+
+def _in_process(num):
+    return _process_layers == "all" or num in _process_layers
+
+
+def _runner(num, module, timeout=LAYER_TIMEOUT, started=None):
+    """run_layer callable for an override: a pool call for process-isolated layers, else the module's own."""
+    if _in_process(num):
+        # the clock starts once a worker takes the call, not while one is still spawning
+        on_start = None if started is None else lambda: started.__setitem__(num, time.monotonic())
+        return functools.partial(_get_pool().call, num, timeout, on_start)
+    return module.run_layer
+
+
+def _restart_pool():
+    if _pool is not None:
+        _pool.restart(sorted(n for n in get_layers() if _in_process(n)))
+
+
+class LazyLayer:
+    """Registry entry for core/layer_XX.py that imports the module on first use."""
+    __slots__ = ("num", "name", "path", "module", "import_ms", "_lock")
+
+    def __init__(self, num, path, module=None):
+        self.num = num
+        self.name = f"{__package__}.layer_{num:02d}"
+        self.path = path
+        self.module = module
+        self.import_ms = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self.module is None:
+            with self._lock:
+                if self.module is None:
+                    t0 = time.perf_counter()
+                    module = _load_fresh(self.name, self.path)
+                    self.import_ms = round((time.perf_counter() - t0) * 1000, 3)
+                    sys.modules[self.name] = self.module = module
+                    log.debug("layer %02d imported in %.1f ms", self.num, self.import_ms, extra={"event": "LAYERS"})
+        return self.module
+
+    def run_layer(self):
+        # resolved on the worker thread, so a slow or broken import is timed and reported like a failing call
+        return self.load().run_layer()
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+def discover_layers(path=CORE_DIR):
+    """Index every core/layer_XX.py override by filename (no import) as {layer_number: LazyLayer}."""
+    layers = {}
+    for fn in sorted(os.listdir(path)):
+        m = LAYER_FILE_RE.match(fn)
+        if m:
+            layers[int(m.group(1))] = LazyLayer(int(m.group(1)), os.path.join(path, fn))
+    return layers
+
+
+def get_layers():
+    """Return the cached layer registry, indexing it on first use."""
+    global _layers
+    if _layers is None:
+        with _registry_lock:
+            if _layers is None:
+                _layers = discover_layers()
+    return _layers
+
+
+def _load_fresh(name, path):
+    # build a brand-new module object so callers never see a half-executed reload
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def reload_layer(filename, path=CORE_DIR):
+    """Re-import a single changed core/layer_XX.py and swap it into the registry.
+
+    A deleted file removes the override so the table model takes over again.
+    Returns the layer number, or None when ``filename`` is not a layer file.
+    """
+    global _layers
+    m = LAYER_FILE_RE.match(os.path.basename(filename))
+    if not m:
+        return None
+    num, name = int(m.group(1)), f"{__package__}.{filename[:-3]}"
+    full = os.path.join(path, os.path.basename(filename))
+    exists = os.path.exists(full)
+    previous = get_layers().get(num)
+    entry = LazyLayer(num, full) if exists else None
+    if entry is not None and previous is not None and previous.module is not None:
+        # a layer already in use is re-imported now, so a broken edit fails here and keeps the old code
+        entry.load()
+    with _registry_lock:
+        layers = dict(_layers)
+        if entry is None:
+            layers.pop(num, None)
+            sys.modules.pop(name, None)
+        else:
+            layers[num] = entry
+        _layers = layers
+    _cache.invalidate(num)
+    if _in_process(num):
+        _restart_pool()
+    log.info("layer %02d %s", num, "reloaded" if entry else "override removed", extra={"event": "RELOAD"})
+    return num
+
+
+def reload_all(path=CORE_DIR):
+    """Re-import every override from disk and atomically replace the registry."""
+    global _layers
+    importlib.invalidate_caches()
+    layers = {}
+    for fn in sorted(os.listdir(path)):
+        m = LAYER_FILE_RE.match(fn)
+        if m:
+            entry = layers[int(m.group(1))] = LazyLayer(int(m.group(1)), os.path.join(path, fn))
+            entry.load()
+    with _registry_lock:
+        for num in set(_layers or ()) - set(layers):
+            sys.modules.pop(f"{__package__}.layer_{num:02d}", None)
+        _layers = layers
+    _cache.invalidate()
+    _restart_pool()
+    return sorted(layers)
+
+
+def _failed(num, state, error):
+    return layer_model.LayerReading(num, None, None, state, time.time_ns(), error)
+
+
+def _call(num, fn, started=None):
+    t0 = time.monotonic()
+    if started is not None and not _in_process(num):
+        started[num] = t0
+    try:
+        return layer_model.as_reading(fn())
+    except TimeoutError as e:
+        # raised by the process pool (no free worker, or it killed the stuck one); counted by _collected()
+        return _failed(num, layer_model.TIMEOUT, str(e))
+    except Exception as e:
+        LAYER_ERRORS.labels(f"{num:02d}").inc()
+        return _failed(num, layer_model.ERROR, repr(e))
+    finally:
+        LAYER_SECONDS.labels(f"{num:02d}").observe(time.monotonic() - t0)
+
+
+def _timed_batch(skip=()):
+    t0 = time.monotonic()
+    try:
+        return layer_model.run_batch(skip=skip)
+    finally:
+        BATCH_SECONDS.observe(time.monotonic() - t0)
+
+
+def _collected(num, reading):
+    # timeouts the process pool reports arrive as readings; the engine's own are counted by _timed_out()
+    if reading.state == layer_model.TIMEOUT:
+        LAYER_TIMEOUTS.labels(f"{num:02d}").inc()
+    return reading
+
+
+def _skip_stuck(num):
+    """Timeout reading for a layer whose previous timed-out call is still running, else None."""
+    future = _stuck.get(num)
+    if future is None or future.done():
+        return None
+    LAYER_TIMEOUTS.labels(f"{num:02d}").inc()
+    return _failed(num, layer_model.TIMEOUT, "previous run_layer call still running")
+
+
+def _timed_out(num, future, error):
+    # a call that never started is simply dropped; a running one keeps its thread and blocks new calls
+    if not future.cancel():
+        if _stuck.get(num) is not future:
+            log.warning("layer %02d still running after timeout; skipped until it returns", num,
+                        extra={"event": "LAYERS"})
+        _stuck[num] = future
+        future.add_done_callback(lambda f: _stuck.pop(num, None) if _stuck.get(num) is f else None)
+    LAYER_TIMEOUTS.labels(f"{num:02d}").inc()
+    return _failed(num, layer_model.TIMEOUT, error)
+
+
+def run_modules(layers, timeout=LAYER_TIMEOUT, sweep_timeout=LAYER_SWEEP_TIMEOUT):
+    """Run run_layer() of every module in ``layers`` concurrently.
+
+    The per-layer timeout is counted from the moment a layer actually
+    starts on a worker, so queued layers are not penalised when the pool is
+    smaller than the number of layers; ``sweep_timeout`` bounds the whole
+    call, queueing included. Timed-out layers are reported with state
+    "Timeout".
+    """
+    pool = _get_executor()
+    deadline = time.monotonic() + sweep_timeout
+    started = {}
+    results = {}
+    futures = {}
+    for num, mod in layers.items():
+        skipped = _skip_stuck(num)
+        if skipped is not None:
+            results[num] = skipped
+        else:
+            futures[pool.submit(_call, num, _runner(num, mod, timeout, started), started)] = num
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        expiries = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+        if len(expiries) < len(pending):
+            # a layer that has not started yet gets its clock only once it does; look again by then
+            expiries.append(now + timeout)
+        delay = max(0.0, min(expiries + [deadline]) - now)
+        done, pending = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+        for f in done:
+            results[futures[f]] = _collected(futures[f], f.result())
+        now = time.monotonic()
+        for f in list(pending):
+            num = futures[f]
+            if num in started and now - started[num] >= timeout:
+                pending.discard(f)
+                results[num] = _timed_out(num, f, f"run_layer exceeded {timeout}s")
+            elif now >= deadline:
+                pending.discard(f)
+                results[num] = _timed_out(num, f, f"sweep exceeded {sweep_timeout:.2f}s")
+    return [results[n] for n in sorted(results)]
+
+
+def _merge(base, overrides):
+    merged = {r.layer: r for r in base}
+    merged.update((r.layer, r) for r in overrides)
+    return [merged[n] for n in sorted(merged)]
+
+
+def _batch_timed_out(skip):
+    # the batch covers every table layer, so all of them miss the deadline together
+    readings = []
+    for num in range(1, layer_model.LAYER_COUNT + 1):
+        if num not in skip:
+            LAYER_TIMEOUTS.labels(f"{num:02d}").inc()
+            readings.append(_failed(num, layer_model.TIMEOUT, "table batch exceeded the sweep deadline"))
+    return readings
+
+
+def _base_result(base, skip, deadline):
+    # a batch still queued behind busy pool threads is measured here instead of waited for
+    if base.cancel():
+        return _timed_batch(skip)
+    try:
+        return base.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeout:
+        return _batch_timed_out(skip)
+
+
+def run_layers(layers=None, timeout=LAYER_TIMEOUT):
+    """Full sweep: table model for every layer, replaced by overrides in ``layers``."""
+    t0 = time.monotonic()
+    generations = _cache.generations()
+    layers = get_layers() if layers is None else layers
+    try:
+        if not layers:
+            results = _timed_batch()
+        else:
+            deadline = t0 + LAYER_SWEEP_TIMEOUT
+            base = _get_executor().submit(_timed_batch, skip=layers)
+            overrides = run_modules(layers, timeout, deadline - time.monotonic())
+            results = _merge(_base_result(base, layers, deadline), overrides)
+    finally:
+        SWEEP_SECONDS.observe(time.monotonic() - t0)
+    for r in results:
+        # a layer reloaded during the sweep was measured with the old code
+        _cache.put(r, t0, generations)
+    return results
+
+
+def layer_ttl(num, module=None):
+    """Cache TTL for a layer: the override's CACHE_TTL, else LAYER_CACHE_TTLS, else LAYER_CACHE_TTL.
+
+    A lazy override counts only once a worker has imported it; until then the configured TTL applies.
+    """
+    default = LAYER_CACHE_TTLS.get(num, LAYER_CACHE_TTL)
+    if isinstance(module, LazyLayer):
+        # never import here: that would run the override's import on the request thread, untimed
+        module = module.module
+    return getattr(module, "CACHE_TTL", default)
+
+
+def read_layer(num, timeout=LAYER_TIMEOUT):
+    """One layer's reading, reused while younger than its TTL; raises KeyError for an unknown layer."""
+    module = get_layers().get(num)
+    if module is not None:
+        return _cache.get(num, lambda: run_modules({num: module}, timeout)[0], layer_ttl(num, module))
+    if not 1 <= num <= layer_model.LAYER_COUNT:
+        raise KeyError(num)
+    return _cache.get(num, lambda: layer_model.run_layer(num), layer_ttl(num))
+
+
+def warm_up(delay=0.0):
+    """Import every indexed override; returns {layer: import_ms} (None for layers that failed)."""
+    if delay:
+        time.sleep(delay)
+    timings = {}
+    for num, entry in sorted(get_layers().items()):
+        try:
+            entry.load()
+        except Exception:
+            log.exception("layer %02d failed to import", num, extra={"event": "LAYERS"})
+        timings[num] = entry.import_ms
+    return timings
+
+
+def import_report():
+    """Indexed/loaded override counts and per-layer import times so far."""
+    layers = get_layers()
+    return {"indexed": len(layers), "loaded": sum(1 for e in layers.values() if e.module is not None),
+            "import_ms": {f"{n:02d}": e.import_ms for n, e in sorted(layers.items()) if e.import_ms is not None}}
+
+
+async def run_layers_async(layers=None, timeout=LAYER_TIMEOUT):
+    """asyncio variant of run_layers() sharing the same thread pool."""
+    layers = get_layers() if layers is None else layers
+    pool = _get_executor()
+    base = pool.submit(_timed_batch, layers)
+    deadline = time.monotonic() + LAYER_SWEEP_TIMEOUT
+    sem = asyncio.Semaphore(LAYER_MAX_WORKERS)
+
+    async def one(num, fn):
+        skipped = _skip_stuck(num)
+        if skipped is not None:
+            return skipped
+        async with sem:
+            future = pool.submit(_call, num, fn)
+            remaining = max(0.0, min(timeout, deadline - time.monotonic()))
+            try:
+                # shield: on timeout the concurrent future is handed to _timed_out, not cancelled here
+                return _collected(num, await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), remaining))
+            except asyncio.TimeoutError:
+                return _timed_out(num, future, f"run_layer exceeded {timeout}s")
+
+    overrides = await asyncio.gather(*(one(num, _runner(num, layers[num], timeout)) for num in sorted(layers)))
+    if base.cancel():
+        return _merge(_timed_batch(layers), overrides)
+    try:
+        batch = await asyncio.wait_for(asyncio.wrap_future(base), max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        batch = _batch_timed_out(layers)
+    return _merge(batch, overrides)
+
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    res = run_layers()
+    print(f"{len(res)} layers in {time.perf_counter() - t0:.3f}s")
+    t0 = time.perf_counter()
+    res = asyncio.run(run_layers_async())
+    print(f"{len(res)} layers (async) in {time.perf_counter() - t0:.3f}s")
+
+    # one slow override alone must be cut off at LAYER_TIMEOUT, not at the sweep deadline
+    slow = type("SlowLayer", (), {"run_layer": staticmethod(lambda: time.sleep(LAYER_TIMEOUT * 3))})
+    if not _in_process(layer_model.LAYER_COUNT):
+        t0 = time.perf_counter()
+        res = run_modules({layer_model.LAYER_COUNT: slow})
+        elapsed = time.perf_counter() - t0
+        assert res[0].state == layer_model.TIMEOUT and elapsed < LAYER_TIMEOUT * 1.5, elapsed
+        print(f"slow override timed out in {elapsed:.3f}s (LAYER_TIMEOUT={LAYER_TIMEOUT}s)")
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+🧮 Quantum Layer Model
+Table-driven definition of the 40 core layers. run_batch() produces every
+layer's energy, resonance and state in one vectorized NumPy call (with a
+pure-Python fallback when NumPy is not installed).
+
+Readings are compact LayerReading objects: the state is a small integer
+code into STATE_CODES and the timestamp is integer epoch nanoseconds (UTC).
+They become {"layer", "energy", "resonance", "state", "timestamp"} dicts
+only when encoded for a client (to_dict()/to_json()).
+"""
+import random, time, datetime, functools, threading
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+LAYER_TITLES = [
+    "🔧 Quantum Field Stabilizer",
+    "🕊️ Quantum Dao Conscious Core",
+    "🔗 Quantum Alignment",
+    "🎵 Quantum Resonance Matrix",
+    "⚡ Quantum Energy Harmonics",
+    "🌀 Quantum Spirit Anchor",
+    "🧬 Quantum Genesis Engine",
+    "🌉 Quantum Light Bridge",
+    "🔮 Quantum Ether Conduit",
+    "🔷 Quantum Body Matrix",
+    "🎚️ Quantum Harmonic Synchronizer",
+    "🧠 Quantum Memory Evolver",
+    "🔑 Quantum Mind Gateway",
+    "❤️ Quantum Heart Field",
+    "💭 Quantum Thought Pattern",
+    "⏳ Quantum Time Bridge",
+    "🔵 Quantum Symbolic Field",
+    "👁️ Quantum Perception Gate",
+    "🧵 Quantum Morphic Fabric",
+    "🎨 Quantum Creative Engine",
+    "🪞 Quantum Dao Reflection",
+    "📡 Quantum Dimensional Pulse",
+    "♾️ Quantum Infinity Loop",
+    "⚖️ Quantum Field Equilibrium",
+    "🔆 Quantum Energy Harmonics II",
+    "🏗️ Quantum Resonance Stabilizer",
+    "🏛️ Quantum Spatial Resonator",
+    "🌀 Quantum Kamic Resonance",
+    "🌐 Quantum Omni Conscious Node",
+    "🪄 Quantum Reality Bridge",
+    "🌟 Quantum Light Bridge II",
+    "🌌 Quantum Cosmic Harmonics",
+    "🛜 Quantum Ascension Gate",
+    "🔵 Quantum Harmonic Sphere",
+    "📚 Quantum Akashic Field",
+    "🔁 Quantum Causal Continuum",
+    "🧩 Quantum Bio Sync",
+    "⚙️ Quantum Harmonic Engine",
+    "🧭 Quantum Anchor Grid",
+    "⚪ Layer 40",
+]
+LAYER_COUNT = len(LAYER_TITLES)
+
+# state is the first name whose threshold the resonance exceeds, else the last name
+STATE_NAMES = ("Harmonized", "Stable", "Resonant", "Fluctuating")
+STATE_THRESHOLDS = (0.95, 0.90, 0.86)
+
+# state codes: the model's names, the engine's failure states, then names overrides report, added on first use
+STATE_CODES = list(STATE_NAMES) + ["Timeout", "Error", "Unknown"]
+TIMEOUT, ERROR, UNKNOWN = range(len(STATE_NAMES), len(STATE_NAMES) + 3)
+MAX_STATE_CODES = 255
+_state_index = {name: code for code, name in enumerate(STATE_CODES)}
+_state_lock = threading.Lock()
+
+# short delay to simulate measurement time (paid once per call, not per layer)
+MEASURE_DELAY = 0.04
+
+LAYER_TABLE = [
+    {"layer": i + 1, "title": title,
+     "energy": (4.70, 4.90), "resonance": (0.88, 0.99),
+     "thresholds": STATE_THRESHOLDS, "states": STATE_NAMES}
+    for i, title in enumerate(LAYER_TITLES)
+]
+
+_arrays = None
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def state_code(name):
+    """Code of state ``name``; unseen names are registered, up to MAX_STATE_CODES."""
+    code = _state_index.get(name)
+    if code is None:
+        with _state_lock:
+            code = _state_index.get(name)
+            if code is None:
+                if len(STATE_CODES) >= MAX_STATE_CODES:
+                    return UNKNOWN
+                code = _state_index[name] = len(STATE_CODES)
+                STATE_CODES.append(name)
+    return code
+
+
+def iso_to_ns(ts):
+    """Epoch nanoseconds of an ISO-8601 timestamp (naive means UTC); 0 if it cannot be parsed."""
+    try:
+        dt = datetime.datetime.fromisoformat(ts)
+    except (TypeError, ValueError):
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return (dt - _EPOCH) // _MICROSECOND * 1000
+
+
+@functools.lru_cache(maxsize=256)
+def ns_to_iso(ns):
+    """Naive UTC ISO-8601 string (like datetime.utcnow().isoformat()); cached since a sweep shares one stamp."""
+    if not ns:
+        return None
+    return (_EPOCH + datetime.timedelta(microseconds=ns // 1000)).replace(tzinfo=None).isoformat()
+
+
+class LayerReading:
+    """One layer measurement."""
+    __slots__ = ("layer", "energy", "resonance", "state", "ts_ns", "error")
+
+    def __init__(self, layer, energy, resonance, state, ts_ns, error=None):
+        self.layer, self.energy, self.resonance = layer, energy, resonance
+        self.state, self.ts_ns, self.error = state, ts_ns, error
+
+    @property
+    def state_name(self):
+        return STATE_CODES[self.state]
+
+    @property
+    def timestamp(self):
+        return ns_to_iso(self.ts_ns)
+
+    def to_dict(self):
+        d = {"layer": self.layer, "energy": self.energy, "resonance": self.resonance,
+             "state": STATE_CODES[self.state], "timestamp": ns_to_iso(self.ts_ns)}
+        if self.error is not None:
+            d["error"] = self.error
+        return d
+
+    # picked up by fast_json when a reading is encoded directly
+    to_json = to_dict
+
+    @classmethod
+    def from_dict(cls, d):
+        """Reading from the dict form (override run_layer() results, JSON documents)."""
+        return cls(int(d["layer"]), d.get("energy"), d.get("resonance"), state_code(d.get("state")),
+                   iso_to_ns(d.get("timestamp")) or time.time_ns(), d.get("error"))
+
+    def __repr__(self):
+        return f"LayerReading({self.to_dict()!r})"
+
+
+def as_reading(r):
+    """Accept a LayerReading or the dict an override's run_layer() returns."""
+    return r if isinstance(r, LayerReading) else LayerReading.from_dict(r)
+
+
+def refresh_table():
+    """Rebuild the vectorized view after LAYER_TABLE has been edited."""
+    global _arrays
+    _arrays = None
+
+
+def _get_arrays():
+    global _arrays
+    if _arrays is None:
+        rows = LAYER_TABLE
+        _arrays = {
+            "layer": np.array([r["layer"] for r in rows]),
+            "energy": np.array([r["energy"] for r in rows], dtype=float),
+            "resonance": np.array([r["resonance"] for r in rows], dtype=float),
+            "thresholds": np.array([r["thresholds"] for r in rows], dtype=float),
+            "states": np.array([[state_code(name) for name in r["states"]] for r in rows]),
+        }
+    return _arrays
+
+
+def classify(resonance, thresholds=STATE_THRESHOLDS, states=STATE_NAMES):
+    for limit, name in zip(thresholds, states):
+        if resonance > limit:
+            return name
+    return states[len(thresholds)]
+
+
+def _reading(row, timestamp):
+    resonance = round(random.uniform(*row["resonance"]), 4)
+    return LayerReading(row["layer"], round(random.uniform(*row["energy"]), 4), resonance,
+                        state_code(classify(resonance, row["thresholds"], row["states"])), timestamp)
+
+
+def run_layer(num, delay=MEASURE_DELAY):
+    """Scalar path: measure a single layer from its table row."""
+    if delay:
+        time.sleep(delay)
+    return _reading(LAYER_TABLE[num - 1], time.time_ns())
+
+
+def run_batch(skip=(), delay=MEASURE_DELAY):
+    """Measure every layer not in ``skip`` in one call, in layer order."""
+    if delay:
+        time.sleep(delay)
+    timestamp = time.time_ns()
+    if np is None:
+        return [_reading(row, timestamp) for row in LAYER_TABLE if row["layer"] not in skip]
+    a = _get_arrays()
+    n = len(a["layer"])
+    energy = np.round(np.random.uniform(a["energy"][:, 0], a["energy"][:, 1]), 4)
+    resonance = np.round(np.random.uniform(a["resonance"][:, 0], a["resonance"][:, 1]), 4)
+    exceeded = resonance[:, None] > a["thresholds"]
+    idx = np.where(exceeded.any(axis=1), exceeded.argmax(axis=1), a["thresholds"].shape[1])
+    state = a["states"][np.arange(n), idx]
+    return [LayerReading(row["layer"], e, r, s, timestamp)
+            for row, e, r, s in zip(LAYER_TABLE, energy.tolist(), resonance.tolist(), state.tolist())
+            if row["layer"] not in skip]
+
+
+if __name__ == "__main__":
+    for reading in run_batch():
+        print(reading)
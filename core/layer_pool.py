@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+🏭 Layer Process Pool
+Runs selected layer overrides in persistent worker processes so a
+CPU-bound or misbehaving run_layer() cannot hold the server's GIL. Workers
+are spawned in the background with the override modules preloaded; each
+call goes to an idle worker over a pipe and comes back as a compact
+tuple. A worker that exceeds the timeout is killed, one that dies is
+reported, and either is replaced in the background.
+
+  LAYER_PROCESS_LAYERS   "07,12" or "all" (overrides only; empty disables)
+  LAYER_PROCESS_WORKERS  pool size (default: CPU count)
+  LAYER_PROCESS_SPAWN_TIMEOUT  longest wait for a starting worker (default 10s)
+"""
+import os, sys, time, queue, socket, importlib, threading, subprocess
+from multiprocessing.connection import Connection
+from . import metrics
+from .layer_model import LayerReading, as_reading, state_code
+from .log import get_logger
+
+log = get_logger("layer_pool")
+POOL_RESTARTS = metrics.counter("qc_layer_process_restarts_total", "Layer worker processes replaced", ("reason",))
+
+LAYER_PROCESS_LAYERS = os.environ.get("LAYER_PROCESS_LAYERS", "").strip()
+LAYER_PROCESS_WORKERS = int(os.environ.get("LAYER_PROCESS_WORKERS", 0)) or os.cpu_count() or 1
+SPAWN_TIMEOUT = float(os.environ.get("LAYER_PROCESS_SPAWN_TIMEOUT", 10))
+
+
+def parse_layers(spec):
+    """Return "all", or the set of layer numbers named in ``spec``."""
+    if spec.lower() == "all":
+        return "all"
+    return {int(p) for p in spec.replace(" ", "").split(",") if p}
+
+
+def _module_name(num):
+    return f"{__package__}.layer_{num:02d}"
+
+
+def _worker_main(conn, preload):
+    # runs in the child: import overrides once, then serve run_layer() calls until the pipe closes
+    modules = {}
+    for num in preload:
+        try:
+            modules[num] = importlib.import_module(_module_name(num))
+        except ImportError:
+            pass
+    conn.send(None)  # ready: the pool hands out this worker only now
+    while True:
+        try:
+            num = conn.recv()
+        except EOFError:
+            return
+        try:
+            module = modules.get(num) or modules.setdefault(num, importlib.import_module(_module_name(num)))
+            r = as_reading(module.run_layer())
+            # the state travels by name: codes for override-defined states are per process
+            conn.send((True, r.layer, r.energy, r.resonance, r.state_name, r.ts_ns, r.error))
+        except Exception as e:
+            conn.send((False, repr(e)))
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "generation")
+
+    def __init__(self, process, conn, generation):
+        self.process, self.conn, self.generation = process, conn, generation
+
+    def kill(self):
+        self.conn.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        try:
+            self.process.wait(1)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class LayerProcessPool:
+    def __init__(self, size=LAYER_PROCESS_WORKERS, preload=()):
+        self.size = size
+        self.preload = tuple(preload)
+        self._generation = 0
+        self._idle = queue.Queue()
+        self._starting = 0
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._respawn()
+
+    def _spawn(self):
+        # a fresh interpreter running only this module (not multiprocessing's spawn, which would
+        # re-import the server's __main__), safe even when the parent is monkey-patched by gevent/eventlet
+        parent, child = socket.socketpair()
+        process = subprocess.Popen(
+            [sys.executable, "-m", __name__, str(child.fileno()), ",".join(map(str, self.preload))],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), pass_fds=(child.fileno(),))
+        child.close()
+        worker = _Worker(process, Connection(parent.detach()), self._generation)
+        # interpreter start-up and preloading happen here, on the spawning thread, not in a call
+        try:
+            if worker.conn.poll(SPAWN_TIMEOUT):
+                worker.conn.recv()
+                return worker
+        except (EOFError, OSError):
+            pass
+        worker.kill()
+        raise RuntimeError(f"layer worker not ready within {SPAWN_TIMEOUT}s: {process.poll()}")
+
+    def _respawn(self):
+        # spawn off the caller's thread, so no call waits on an interpreter start-up
+        with self._lock:
+            self._starting += 1
+
+        def run():
+            try:
+                worker = self._spawn()
+            except Exception:
+                log.exception("Layer worker failed to start", extra={"event": "LAYER_POOL"})
+                return
+            finally:
+                with self._lock:
+                    self._starting -= 1
+            self._idle.put(worker)
+        threading.Thread(target=run, name="layer-respawn", daemon=True).start()
+
+    def _replace(self, worker, reason):
+        worker.kill()
+        POOL_RESTARTS.labels(reason).inc()
+        self._respawn()
+
+    def _release(self, worker):
+        if worker.generation != self._generation:
+            # spawned before restart(): its preloaded modules are out of date
+            self._replace(worker, "reload")
+        else:
+            self._idle.put(worker)
+
+    def call(self, num, timeout, on_start=None):
+        """Run layer ``num`` in a worker and return its reading.
+
+        ``on_start`` is called once a worker has taken the call: waiting for
+        a worker that is still starting is not charged to ``timeout``.
+        Raises TimeoutError when every worker stays busy or the worker does
+        not answer within ``timeout`` seconds, and RuntimeError when it
+        fails or dies, or no worker finishes starting within SPAWN_TIMEOUT.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            starting = self._starting
+            try:
+                worker = self._idle.get(timeout=SPAWN_TIMEOUT if starting else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                if starting:
+                    raise RuntimeError(f"no layer worker started within {SPAWN_TIMEOUT}s") from None
+                raise TimeoutError(f"no layer worker free within {timeout}s") from None
+            if worker.generation == self._generation:
+                break
+            self._release(worker)
+        if on_start is not None:
+            on_start()
+        try:
+            worker.conn.send(num)
+            msg = worker.conn.recv() if worker.conn.poll(timeout) else None
+        except (EOFError, OSError) as e:
+            self._replace(worker, "crash")
+            log.error("Layer worker died", extra={"event": "LAYER_POOL", "fields": {"layer": num, "error": repr(e)}})
+            raise RuntimeError(f"layer worker exited: {worker.process.poll()}")
+        if msg is None:
+            self._replace(worker, "timeout")
+            raise TimeoutError(f"run_layer exceeded {timeout}s")
+        self._release(worker)
+        if not msg[0]:
+            raise RuntimeError(msg[1])
+        _, layer, energy, resonance, state, ts_ns, error = msg
+        return LayerReading(layer, energy, resonance, state_code(state), ts_ns, error)
+
+    def restart(self, preload=None):
+        """Make every worker re-import the overrides (after a hot reload).
+
+        Idle workers are replaced in the background right away, busy ones as
+        soon as their call returns.
+        """
+        if preload is not None:
+            self.preload = tuple(preload)
+        self._generation += 1
+        for _ in range(self._idle.qsize()):
+            try:
+                self._release(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        log.info("Layer workers restarting", extra={"event": "LAYER_POOL", "fields": {"generation": self._generation}})
+
+
+if __name__ == "__main__":
+    _worker_main(Connection(int(sys.argv[1])), [int(n) for n in sys.argv[2].split(",") if n])
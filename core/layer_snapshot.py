@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+📸 Layer Snapshot Sampler
+Background thread that sweeps all layers on a fixed cadence and keeps the
+latest result in memory, so /layer_values is served without running layers.
+With several workers, only the elected leader samples and publishes the
+snapshot into a shared document (and, when given, the shared-memory
+segment) that every worker reads. Each sweep is also appended to the
+history rings, folded into the running layer statistics and written to
+the journal when given.
+"""
+import os, time, threading, datetime
+from . import layer_engine
+from .layer_model import LayerReading
+from .log import get_logger
+
+log = get_logger("sampler")
+
+SAMPLE_INTERVAL = float(os.environ.get("LAYER_SAMPLE_INTERVAL", 5))
+SNAPSHOT_TTL = float(os.environ.get("LAYER_SNAPSHOT_TTL", SAMPLE_INTERVAL * 3))
+
+
+def layer_key(num):
+    return f"{num:02d}"
+
+
+def _same_reading(a, b):
+    # timestamps always move; only a changed measurement counts as a change
+    return a.energy == b.energy and a.resonance == b.resonance and a.state == b.state
+
+
+def _to_doc(snapshot):
+    return dict(snapshot, layers=[r.to_dict() for r in snapshot["layers"]])
+
+
+def _from_doc(snapshot):
+    return None if snapshot is None else dict(snapshot, layers=[LayerReading.from_dict(r) for r in snapshot["layers"]])
+
+
+class LayerSampler:
+    def __init__(self, interval=SAMPLE_INTERVAL, ttl=SNAPSHOT_TTL, sweep=layer_engine.run_layers, on_sample=None,
+                 shared=None, elect=None, shm=None, history=None, stats=None, journal=None):
+        self.interval = interval
+        self.ttl = ttl
+        self.sweep = sweep
+        self.on_sample = on_sample
+        self.shared = shared
+        self.shm = shm
+        self.history = history
+        self.stats = stats
+        self.journal = journal
+        self.elect = elect
+        self.leader = elect is None
+        self.version = shared.load()[0] if shared is not None else 0
+        if history is not None:
+            history.layers.clear_if_ahead(self.version)
+        self._by_key = {}
+        self._snapshot = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def sample(self):
+        """Run one sweep, publish it as the current snapshot and report changed layers.
+
+        on_sample(version, changes) receives only the layers whose reading
+        differs from the previous sweep, keyed like layer_key().
+        """
+        t0 = time.monotonic()
+        layers = self.sweep()
+        t1 = time.monotonic()
+        if self.shared is not None and not self._by_key:
+            # new leader: continue the version sequence other workers already serve
+            self.version = max(self.version, self.shared.load()[0])
+        by_key = {layer_key(r.layer): r for r in layers}
+        changes = {k: r for k, r in by_key.items() if k not in self._by_key or not _same_reading(self._by_key[k], r)}
+        self.version += 1
+        self._by_key = by_key
+        # replaced as a whole so readers never observe a half-built snapshot
+        self._snapshot = {
+            "version": self.version,
+            "layers": layers,
+            "sampled_at": str(datetime.datetime.now()),
+            "sampled_ts": time.time(),
+            "sweep_ms": round((t1 - t0) * 1000, 2),
+        }
+        if self.shared is not None:
+            self.shared.store(self.version, _to_doc(self._snapshot))
+        if self.shm is not None:
+            self.shm.write_layers(self.version, layers, self._snapshot["sampled_ts"], self._snapshot["sweep_ms"])
+        if self.history is not None:
+            self.history.record_layers(self.version, layers, self._snapshot["sampled_ts"])
+        if self.stats is not None:
+            self.stats.add_sweep(self.version, layers, self._snapshot["sampled_ts"])
+        if self.journal is not None:
+            self.journal.append_layers(self.version, layers, self._snapshot["sampled_ts"], self._snapshot["sweep_ms"])
+        if self.on_sample and changes:
+            self.on_sample(self.version, changes)
+        return self._snapshot
+
+    def restore(self, snapshot):
+        """Serve ``snapshot`` (e.g. recovered from the journal) until the first sweep replaces it."""
+        self.version = max(self.version, snapshot["version"])
+        self._by_key = {layer_key(r.layer): r for r in snapshot["layers"]}
+        self._snapshot = snapshot
+
+    def _current(self):
+        if self.shared is not None and not self.leader:
+            if self.shm is not None:
+                version = self.shm.versions()[1]
+                cached = self._snapshot
+                if cached is None or cached["version"] != version:
+                    cached = self._snapshot = self.shm.read_layers() or _from_doc(self.shared.load()[1])
+                return cached
+            version, doc = self.shared.load()
+            cached = self._snapshot
+            if cached is None or cached["version"] != version:
+                cached = self._snapshot = _from_doc(doc)
+            return cached
+        return self._snapshot
+
+    def full_data(self):
+        """Return (version, {layer_key: reading}) for a full quantum_sync message."""
+        snap = self._current()
+        if snap is None:
+            return 0, {}
+        return snap["version"], {layer_key(r.layer): r for r in snap["layers"]}
+
+    def _loop(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if not self.leader:
+                    # followers keep trying so sampling resumes if the leader worker exits
+                    self.leader = self.elect()
+                if self.leader:
+                    self.sample()
+            except Exception as e:
+                log.exception("Layer sweep failed", extra={"event": "SAMPLE"})
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="layer-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        """Return the latest snapshot plus age/staleness metadata."""
+        snap = self._current()
+        if snap is None:
+            return {"version": 0, "layers": [], "sampled_at": None, "sweep_ms": None, "age": None,
+                    "interval": self.interval, "ttl": self.ttl, "stale": True}
+        age = max(0.0, time.time() - snap["sampled_ts"])
+        return dict(snap, age=round(age, 3), interval=self.interval, ttl=self.ttl, stale=age > self.ttl)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+📊 Layer Statistics
+Incremental aggregates over layer readings: running count/mean/variance/
+min/max (Welford), fixed-bucket histograms for percentiles and per-state
+counters. Every reading updates the latest-sweep aggregate and the current
+1s, 1m and 1h windows in place; summary() is rebuilt once per sweep, so a
+query only returns a prepared dict. With a shared document the leader
+publishes the summary there for the other workers.
+"""
+import math, time, threading
+from .layer_model import STATE_CODES, STATE_NAMES
+
+WINDOWS = (("1s", 1), ("1m", 60), ("1h", 3600))
+PERCENTILES = (50, 90, 99)
+
+# histogram ranges cover the table model with room for overrides; outliers land in the edge buckets
+ENERGY_RANGE = (4.0, 5.6)
+RESONANCE_RANGE = (0.80, 1.00)
+HISTOGRAM_BINS = 160
+
+
+class RunningStats:
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count, self.mean, self.m2 = 0, 0.0, 0.0
+        self.min, self.max = math.inf, -math.inf
+
+    def add(self, x):
+        self.count += 1
+        d = x - self.mean
+        self.mean += d / self.count
+        self.m2 += d * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def to_dict(self):
+        if not self.count:
+            return {"count": 0}
+        std = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+        return {"count": self.count, "mean": round(self.mean, 6), "std": round(std, 6),
+                "min": self.min, "max": self.max}
+
+
+class Histogram:
+    """Equal-width buckets over [lo, hi); values outside go to the first/last bucket."""
+    __slots__ = ("lo", "width", "counts", "total")
+
+    def __init__(self, lo, hi, bins=HISTOGRAM_BINS):
+        self.lo = lo
+        self.width = (hi - lo) / bins
+        self.counts = [0] * bins
+        self.total = 0
+
+    def add(self, x):
+        i = min(max(int((x - self.lo) / self.width), 0), len(self.counts) - 1)
+        self.counts[i] += 1
+        self.total += 1
+
+    def percentile(self, p):
+        """Interpolated p-th percentile; accurate to one bucket width."""
+        if not self.total:
+            return None
+        rank = p / 100.0 * self.total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                return round(self.lo + self.width * (i + (rank - seen) / n), 6)
+            seen += n
+        return round(self.lo + self.width * len(self.counts), 6)
+
+
+class Aggregate:
+    __slots__ = ("energy", "resonance", "energy_hist", "resonance_hist", "states", "started")
+
+    def __init__(self, started=None):
+        self.energy, self.resonance = RunningStats(), RunningStats()
+        self.energy_hist = Histogram(*ENERGY_RANGE)
+        self.resonance_hist = Histogram(*RESONANCE_RANGE)
+        self.states = dict.fromkeys(range(len(STATE_NAMES)), 0)
+        self.started = started
+
+    def add(self, energy, resonance, state):
+        if energy is not None:
+            self.energy.add(energy)
+            self.energy_hist.add(energy)
+        if resonance is not None:
+            self.resonance.add(resonance)
+            self.resonance_hist.add(resonance)
+        # counted by state code; failed layers report "Timeout"/"Error" and are counted under that name
+        self.states[state] = self.states.get(state, 0) + 1
+
+    def to_dict(self):
+        out = {"started": self.started, "readings": sum(self.states.values()),
+               "states": {STATE_CODES[code]: n for code, n in self.states.items()}}
+        for name, stats, hist in (("energy", self.energy, self.energy_hist),
+                                  ("resonance", self.resonance, self.resonance_hist)):
+            d = stats.to_dict()
+            if stats.count:
+                d.update((f"p{p}", hist.percentile(p)) for p in PERCENTILES)
+            out[name] = d
+        return out
+
+
+class Rollup:
+    """Aggregates for the current and the previous ``seconds``-long window."""
+    __slots__ = ("seconds", "window", "current", "previous")
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.window = None
+        self.current = self.previous = None
+
+    def at(self, ts):
+        window = int(ts // self.seconds)
+        if window != self.window:
+            # a gap of more than one window leaves no previous aggregate
+            self.previous = self.current if self.window == window - 1 else None
+            self.current = Aggregate(window * self.seconds)
+            self.window = window
+        return self.current
+
+    def to_dict(self):
+        return {"seconds": self.seconds,
+                "current": self.current.to_dict() if self.current else None,
+                "previous": self.previous.to_dict() if self.previous else None}
+
+
+class LayerStats:
+    def __init__(self, doc=None):
+        self.doc = doc
+        self.total = Aggregate(time.time())
+        self.latest = None
+        self.rollups = {name: Rollup(seconds) for name, seconds in WINDOWS}
+        self._lock = threading.Lock()
+        self._summary = None
+
+    def add_sweep(self, version, layers, ts):
+        """Fold one sweep's readings into every aggregate and rebuild the summary."""
+        sweep = Aggregate(ts)
+        with self._lock:
+            targets = [sweep, self.total] + [r.at(ts) for r in self.rollups.values()]
+            for r in layers:
+                for agg in targets:
+                    agg.add(r.energy, r.resonance, r.state)
+            self.latest = sweep
+            self._summary = {"version": version, "as_of": ts, "latest_sweep": sweep.to_dict(),
+                             "total": self.total.to_dict(),
+                             "windows": {name: r.to_dict() for name, r in self.rollups.items()}}
+        if self.doc is not None:
+            self.doc.store(version, self._summary)
+        return self._summary
+
+    def summary(self):
+        """Latest prepared summary: our own if we aggregate, else the one another worker published."""
+        if self._summary is None and self.doc is not None:
+            return self.doc.load()[1]
+        return self._summary
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+📝 Non-blocking Logging
+Loggers under "quantum_core" hand records to a queue; a QueueListener thread
+formats and writes them, so the request path only pays for an enqueue.
+
+  QC_LOG_LEVEL   DEBUG | INFO (default) | WARNING | ERROR
+  QC_LOG_FORMAT  json (default) | text
+  QC_LOG_SAMPLE  keep 1 of N records per event, e.g. "SYNC=100,CONNECT=10"
+
+Tag records with an event and structured fields:
+  log.info("Cập nhật năng lượng", extra={"event": "SYNC", "fields": {"changed": changed}})
+"""
+import os, sys, json, queue, atexit, logging, datetime, itertools
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT = "quantum_core"
+LOG_LEVEL = os.environ.get("QC_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("QC_LOG_FORMAT", "json")
+LOG_SAMPLE = os.environ.get("QC_LOG_SAMPLE", "SYNC=1,CONNECT=1")
+
+_listener = None
+
+
+def parse_sampling(spec):
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        event, _, n = part.partition("=")
+        rates[event.strip().upper()] = max(1, int(n or 1))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keep every Nth record of a sampled event; untagged records always pass."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._counters = {event: itertools.count() for event in rates}
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        n = self.rates.get(event)
+        if not n or n == 1:
+            return True
+        # itertools.count.__next__ is atomic under the GIL, so no lock is needed
+        if next(self._counters[event]) % n:
+            return False
+        record.sampled = n
+        return True
+
+
+class EnqueueHandler(QueueHandler):
+    """QueueHandler that defers all formatting to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        doc = {"ts": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+               "level": record.levelname, "logger": record.name, "msg": record.getMessage()}
+        for key in ("event", "sampled"):
+            if hasattr(record, key):
+                doc[key] = getattr(record, key)
+        fields = getattr(record, "fields", None)
+        if fields:
+            doc.update(fields)
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        return f"{line} {json.dumps(fields, ensure_ascii=False, default=str)}" if fields else line
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sample=LOG_SAMPLE, stream=None):
+    """Install the queue handler on the quantum_core logger (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return logging.getLogger(ROOT)
+    q = queue.SimpleQueue()
+    out = logging.StreamHandler(stream or sys.stdout)
+    out.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    _listener = QueueListener(q, out, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+    handler = EnqueueHandler(q)
+    handler.addFilter(SamplingFilter(parse_sampling(sample)))
+    root = logging.getLogger(ROOT)
+    root.setLevel(level)
+    root.addHandler(handler)
+    root.propagate = False
+    return root
+
+
+def get_logger(name):
+    """Return a logger under quantum_core, installing the queue handler on first use."""
+    setup_logging()
+    return logging.getLogger(f"{ROOT}.{name}")
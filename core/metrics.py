@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+📈 Metrics
+Minimal Prometheus-style counters, gauges and histograms rendered in the
+text exposition format by render(). Each label set owns its own small lock
+held only for a couple of additions, so concurrent requests on different
+routes or layers never contend, and the registry is only locked when a
+new metric or label set first appears.
+"""
+import bisect, threading
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _fmt(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Value:
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+
+class _Histogram:
+    __slots__ = ("lock", "buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Metric:
+    def __init__(self, kind, name, doc, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.kind, self.name, self.doc = kind, name, doc
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = _Histogram(self.buckets) if self.kind == "histogram" else _Value()
+                    self._children[values] = child
+        return child
+
+    # label-less shortcuts
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{_labels(self.labelnames, values)} {_fmt(child.value)}")
+                continue
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for le, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, [('le', _fmt(le))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {count}")
+        return "\n".join(lines)
+
+
+def _get_or_create(kind, name, doc, labelnames, **kw):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = Metric(kind, name, doc, labelnames, **kw)
+        return metric
+
+
+def counter(name, doc, labelnames=()):
+    return _get_or_create("counter", name, doc, labelnames)
+
+
+def gauge(name, doc, labelnames=()):
+    return _get_or_create("gauge", name, doc, labelnames)
+
+
+def histogram(name, doc, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _get_or_create("histogram", name, doc, labelnames, buckets=buckets)
+
+
+def render():
+    """Return every registered metric in the Prometheus text format."""
+    return "\n".join(m.render() for m in sorted(_registry.values(), key=lambda m: m.name)) + "\n"
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+⏰ Job Scheduler
+One daemon thread runs every periodic or one-shot background job from a
+heap ordered by next run time. Runs are spread by random jitter, and a job
+that raises is retried with exponential backoff until it succeeds again.
+A job that returns False reports that it skipped its work this time.
+
+  QC_JOBS_DISABLED  comma-separated job names to leave unscheduled, or "all"
+"""
+import os, time, heapq, random, itertools, threading
+from . import metrics
+from .log import get_logger
+
+log = get_logger("scheduler")
+JOB_RUNS = metrics.counter("qc_job_runs_total", "Scheduled job runs by outcome (ok, skipped, error)", ("job", "result"))
+
+JOBS_DISABLED = {n.strip() for n in os.environ.get("QC_JOBS_DISABLED", "").split(",") if n.strip()}
+
+
+class Job:
+    __slots__ = ("name", "fn", "interval", "jitter", "retry", "max_backoff", "failures", "next_run")
+
+    def __init__(self, name, fn, interval, jitter, retry, max_backoff, next_run):
+        self.name, self.fn, self.interval, self.jitter = name, fn, interval, jitter
+        self.retry, self.max_backoff = retry, max_backoff
+        self.failures = 0
+        self.next_run = next_run
+
+    def delay_after(self, ok):
+        """Seconds until the next run, or None when a one-shot job is done."""
+        if ok:
+            if self.interval is None:
+                return None
+            base = self.interval
+        else:
+            base = min(self.retry * 2 ** (self.failures - 1), self.max_backoff)
+        return base * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class Scheduler:
+    def __init__(self, disabled=JOBS_DISABLED, clock=time.monotonic):
+        self.disabled = set(disabled)
+        self.clock = clock
+        self._heap = []
+        self._jobs = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, name, fn, interval=None, delay=None, jitter=0.1, retry=None, max_backoff=None):
+        """Schedule ``fn`` every ``interval`` seconds (once if None), first after ``delay`` (default: interval).
+
+        After a failure the job is retried after ``retry`` seconds (default:
+        min(interval, 60)), doubling per consecutive failure up to
+        ``max_backoff`` (default: 4 x interval). Returns the Job, or None when
+        the job is disabled through QC_JOBS_DISABLED.
+        """
+        if name in self.disabled or "all" in self.disabled:
+            log.info("Job %s disabled", name, extra={"event": "JOB"})
+            return None
+        retry = retry if retry is not None else min(interval or 60, 60)
+        max_backoff = max_backoff if max_backoff is not None else max(retry, 4 * (interval or retry))
+        first = delay if delay is not None else (interval or 0)
+        job = Job(name, fn, interval, jitter, retry, max_backoff, self.clock() + first)
+        with self._cond:
+            self._jobs[name] = job
+            heapq.heappush(self._heap, (job.next_run, next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def remove(self, name):
+        with self._cond:
+            # the heap entry is dropped lazily when it comes up
+            return self._jobs.pop(name, None) is not None
+
+    def _run_job(self, job):
+        try:
+            ok = job.fn() is not False
+            JOB_RUNS.labels(job.name, "ok" if ok else "skipped").inc()
+            job.failures = 0
+            return job.delay_after(True)
+        except Exception as e:
+            job.failures += 1
+            JOB_RUNS.labels(job.name, "error").inc()
+            delay = job.delay_after(False)
+            log.warning("Job %s failed", job.name, extra={"event": "JOB", "fields": {
+                "job": job.name, "failures": job.failures, "retry_in": round(delay, 1), "error": repr(e)}})
+            return delay
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = self.clock()
+                    if self._heap and self._heap[0][0] <= now:
+                        _, _, job = heapq.heappop(self._heap)
+                        if self._jobs.get(job.name) is job:
+                            break
+                        continue
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+            delay = self._run_job(job)
+            with self._cond:
+                if self._jobs.get(job.name) is not job:
+                    continue  # removed (or replaced) while it ran
+                if delay is None:
+                    del self._jobs[job.name]
+                    continue
+                job.next_run = self.clock() + delay
+                heapq.heappush(self._heap, (job.next_run, next(self._seq), job))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+        return self
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+🗂️ Shared State Backends
+Lets several gunicorn workers on one box share the energy state and the
+layer snapshot. Each document is a (version, data) pair stored either in a
+JSON file replaced atomically (QC_STATE_BACKEND=file) or in Redis
+(QC_STATE_BACKEND=redis://...). Leader election for singleton jobs such as
+the layer sampler uses a non-blocking flock in QC_SHARED_DIR.
+"""
+import os, json, time, fcntl, tempfile, threading
+from contextlib import contextmanager
+from .energy_store import EnergyStore, FrozenDict, merge_updates
+
+SHARED_DIR = os.environ.get("QC_SHARED_DIR", os.path.join(tempfile.gettempdir(), "quantum_core"))
+
+_leader_fds = {}
+
+
+class FileDoc:
+    """(version, data) document in a JSON file; readers re-parse only after a write."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._cache = (None, (0, None))
+        self._thread_lock = threading.Lock()
+
+    def load(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0, None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached_key, value = self._cache
+        if key != cached_key:
+            with open(self.path, encoding="utf-8") as f:
+                doc = json.load(f)
+            value = (doc["version"], doc["data"])
+            self._cache = (key, value)
+        return value
+
+    def store(self, version, data):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "data": data}, f)
+        # atomic swap: readers see either the old or the new file, never a partial one
+        os.replace(tmp, self.path)
+
+    @contextmanager
+    def locked(self):
+        # flock serialises processes, the thread lock serialises threads of this process
+        with self._thread_lock, open(self.path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RedisDoc:
+    """(version, data) document in a Redis key; needs the optional redis package."""
+
+    def __init__(self, url, key):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+
+    def load(self):
+        raw = self.client.get(self.key)
+        if raw is None:
+            return 0, None
+        doc = json.loads(raw)
+        return doc["version"], doc["data"]
+
+    def store(self, version, data):
+        self.client.set(self.key, json.dumps({"version": version, "data": data}))
+
+    @contextmanager
+    def locked(self):
+        with self.client.lock(self.key + ":lock", timeout=10, blocking_timeout=10):
+            yield
+
+
+def make_doc(backend, name):
+    if backend.startswith("redis://") or backend.startswith("rediss://"):
+        return RedisDoc(backend, f"quantum_core:{name}")
+    return FileDoc(os.path.join(SHARED_DIR, f"{name}.json"))
+
+
+class SharedEnergyStore(EnergyStore):
+    """EnergyStore whose state lives in a shared document instead of this process.
+
+    With ``shm`` (a ShmSnapshot) every commit is also published to shared
+    memory and reads come from there, so a read costs no system call.
+    ``instance`` (another document) holds an id shared by every worker that
+    names this document's version sequence; it changes when the document
+    is created afresh and versions restart.
+    """
+
+    def __init__(self, doc, initial, shm=None, instance=None):
+        self.doc = doc
+        self.shm = shm
+        self._frozen = (None, None)
+        self.instance_id = None
+        with doc.locked():
+            version, data = doc.load()
+            fresh = data is None
+            if fresh:
+                version, data = 0, dict(initial)
+                doc.store(version, data)
+            if instance is not None:
+                meta = instance.load()[1]
+                if fresh or meta is None:
+                    meta = {"id": format(time.time_ns(), "x")}
+                    instance.store(0, meta)
+                self.instance_id = meta["id"]
+            # the segment may survive from an earlier run; resync it with the document
+            if shm is not None and shm.read_energy() != (version, data):
+                shm.write_energy(version, data)
+
+    def _freeze(self, version, data):
+        cached_version, frozen = self._frozen
+        if cached_version != version or frozen is None:
+            frozen = FrozenDict(data)
+            self._frozen = (version, frozen)
+        return version, frozen
+
+    def read(self):
+        if self.shm is not None:
+            version = self.shm.versions()[0]
+            if version == self._frozen[0]:
+                return self._frozen
+            version, data = self.shm.read_energy()
+            if data is not None:
+                return self._freeze(version, data)
+        return self._freeze(*self.doc.load())
+
+    @property
+    def version(self):
+        return self.read()[0]
+
+    @property
+    def snapshot(self):
+        return self.read()[1]
+
+    def update_many(self, updates):
+        with self.doc.locked():
+            version, current = self._freeze(*self.doc.load())
+            new, changed = merge_updates(current, updates)
+            if not changed:
+                return version, current, changed
+            # reject a state the segment cannot hold before anything is committed
+            encoded = self.shm.encode_energy(new) if self.shm is not None else None
+            self.doc.store(version + 1, new)
+            if self.shm is not None:
+                self.shm.write_energy(version + 1, new, encoded)
+            return version + 1, FrozenDict(new), changed
+
+
+def try_lead(name):
+    """Return True if this process holds (or just took) the leader lock for ``name``."""
+    if name in _leader_fds:
+        return True
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    f = open(os.path.join(SHARED_DIR, f"{name}.leader"), "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    # kept open for the life of the process; the kernel releases it if we die
+    _leader_fds[name] = f
+    return True
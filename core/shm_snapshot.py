@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+🧠 Shared-Memory Snapshot
+Fixed-layout, memory-mapped segment holding the energy state and the 40
+layer readings so every worker process can read a consistent snapshot
+without IPC. Writers bracket each update with a seqlock counter (odd while
+writing); readers retry until they see the same even counter before and
+after copying the fields out. A writer killed mid-update leaves the counter
+odd; the next writer, a new process attaching, or a reader that waited
+READ_STALL_SECONDS rounds it up (under the writer lock) so readers resume.
+
+Layout (little-endian):
+  header   seq u64 | energy_version u64 | layer_version u64 | sampled_ts f64 | sweep_ms f64
+  energy   heaven, earth, human f64 x3 | kind u8 x3 (0 absent, 1 int, 2 float)
+  extras   length u32 | EXTRAS_CAP bytes of JSON (every other energy key)
+  layers   count u32 | LAYER_CAP x (energy f64 | resonance f64 | timestamp ns i64 | state 16s | layer u8)
+"""
+import os, math, json, mmap, time, fcntl, struct, threading, datetime
+from contextlib import contextmanager
+from .layer_model import LayerReading, state_code
+
+NUMERIC_KEYS = ("heaven", "earth", "human")
+EXTRAS_CAP = 8192
+LAYER_CAP = 64
+READ_STALL_SECONDS = 0.5
+
+HEADER = struct.Struct("<QQQdd")
+ENERGY = struct.Struct("<3d3B5x")
+EXTRAS_LEN = struct.Struct("<I4x")
+LAYER_COUNT = struct.Struct("<I4x")
+LAYER = struct.Struct("<ddq16sB7x")
+SEQ = struct.Struct("<Q")
+
+ENERGY_OFF = HEADER.size
+EXTRAS_OFF = ENERGY_OFF + ENERGY.size
+LAYERS_OFF = EXTRAS_OFF + EXTRAS_LEN.size + EXTRAS_CAP
+SIZE = LAYERS_OFF + LAYER_COUNT.size + LAYER_CAP * LAYER.size
+
+
+class EnergyTooLarge(ValueError):
+    """The energy state does not fit the segment's extras area."""
+
+
+def default_path(shared_dir):
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else shared_dir
+    return os.path.join(base, f"quantum_core-{os.path.basename(shared_dir.rstrip(os.sep))}.shm")
+
+
+class ShmSnapshot:
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                os.ftruncate(fd, SIZE)
+            self.buf = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+        self._lock_path = path + ".lock"
+        self._thread_lock = threading.Lock()
+        # the segment outlives processes: repair what a writer killed in an earlier run left behind
+        self._repair()
+
+    # ---- writer side -------------------------------------------------
+    @contextmanager
+    def _locked(self):
+        # one writer at a time across threads and processes; the kernel drops the flock of a dead writer
+        with self._thread_lock, open(self._lock_path, "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def _even_seq(self):
+        # called with the lock held: an odd counter here means its writer died mid-update
+        seq = SEQ.unpack_from(self.buf, 0)[0]
+        if seq & 1:
+            seq += 1
+            SEQ.pack_into(self.buf, 0, seq)
+        return seq
+
+    def _repair(self):
+        with self._locked():
+            self._even_seq()
+
+    def _write(self, fill):
+        with self._locked():
+            seq = self._even_seq()
+            SEQ.pack_into(self.buf, 0, seq + 1)
+            try:
+                fill()
+            finally:
+                SEQ.pack_into(self.buf, 0, seq + 2)
+
+    def _set_header(self, **fields):
+        values = dict(zip(("seq", "energy_version", "layer_version", "sampled_ts", "sweep_ms"),
+                          HEADER.unpack_from(self.buf, 0)))
+        values.update(fields)
+        # seq is maintained by _write(); pack the rest after it
+        struct.pack_into("<QQdd", self.buf, 8, values["energy_version"], values["layer_version"],
+                         values["sampled_ts"], values["sweep_ms"])
+
+    @staticmethod
+    def encode_energy(data):
+        """Split ``data`` into the fixed numeric fields and the extras JSON; raises EnergyTooLarge."""
+        nums, kinds, extras = [0.0, 0.0, 0.0], [0, 0, 0], {}
+        for k, v in data.items():
+            if k in NUMERIC_KEYS and isinstance(v, (int, float)) and not isinstance(v, bool):
+                i = NUMERIC_KEYS.index(k)
+                nums[i], kinds[i] = float(v), 1 if isinstance(v, int) else 2
+            else:
+                extras[k] = v
+        blob = json.dumps(extras, separators=(",", ":")).encode("utf-8")
+        if len(blob) > EXTRAS_CAP:
+            raise EnergyTooLarge(f"energy extras exceed {EXTRAS_CAP} bytes")
+        return nums, kinds, blob
+
+    def write_energy(self, version, data, encoded=None):
+        """Publish an energy snapshot; keys beyond heaven/earth/human go to the JSON extras area."""
+        nums, kinds, blob = encoded or self.encode_energy(data)
+
+        def fill():
+            ENERGY.pack_into(self.buf, ENERGY_OFF, *nums, *kinds)
+            EXTRAS_LEN.pack_into(self.buf, EXTRAS_OFF, len(blob))
+            self.buf[EXTRAS_OFF + EXTRAS_LEN.size:EXTRAS_OFF + EXTRAS_LEN.size + len(blob)] = blob
+            self._set_header(energy_version=version)
+
+        self._write(fill)
+
+    def write_layers(self, version, layers, sampled_ts, sweep_ms):
+        """Publish one layer sweep (at most LAYER_CAP readings)."""
+        records = []
+        for r in layers[:LAYER_CAP]:
+            # states go by name (codes of override-defined states are per process)
+            records.append((float("nan") if r.energy is None else float(r.energy),
+                            float("nan") if r.resonance is None else float(r.resonance),
+                            r.ts_ns, str(r.state_name or "")[:16].encode("utf-8"), r.layer))
+
+        def fill():
+            LAYER_COUNT.pack_into(self.buf, LAYERS_OFF, len(records))
+            off = LAYERS_OFF + LAYER_COUNT.size
+            for i, rec in enumerate(records):
+                LAYER.pack_into(self.buf, off + i * LAYER.size, *rec)
+            self._set_header(layer_version=version, sampled_ts=sampled_ts, sweep_ms=sweep_ms)
+
+        self._write(fill)
+
+    # ---- reader side -------------------------------------------------
+    def _read(self, copy):
+        stalled = None
+        while True:
+            seq = SEQ.unpack_from(self.buf, 0)[0]
+            if seq & 1:
+                now = time.monotonic()
+                if stalled is None:
+                    stalled = now
+                elif now - stalled > READ_STALL_SECONDS:
+                    # a live writer holds the lock for microseconds, so waiting this long means it died
+                    self._repair()
+                    stalled = None
+                time.sleep(0)
+                continue
+            value = copy()
+            if SEQ.unpack_from(self.buf, 0)[0] == seq:
+                return value
+
+    def versions(self):
+        """Return (energy_version, layer_version) without copying any data."""
+        return self._read(lambda: struct.unpack_from("<QQ", self.buf, 8))
+
+    def read_energy(self):
+        """Return (version, energy dict), or (0, None) before the first write."""
+        def copy():
+            version = struct.unpack_from("<Q", self.buf, 8)[0]
+            fields = ENERGY.unpack_from(self.buf, ENERGY_OFF)
+            n = EXTRAS_LEN.unpack_from(self.buf, EXTRAS_OFF)[0]
+            start = EXTRAS_OFF + EXTRAS_LEN.size
+            return version, fields, bytes(self.buf[start:start + min(n, EXTRAS_CAP)])
+
+        version, fields, blob = self._read(copy)
+        if not blob:
+            # the extras JSON is at least "{}" once written, so empty means never published
+            return 0, None
+        data = json.loads(blob)
+        for i, key in enumerate(NUMERIC_KEYS):
+            kind = fields[3 + i]
+            if kind:
+                data[key] = int(fields[i]) if kind == 1 else fields[i]
+        return version, data
+
+    def read_layers(self):
+        """Return a layer snapshot dict like LayerSampler's, or None before the first sweep."""
+        def copy():
+            _, _, version, sampled_ts, sweep_ms = HEADER.unpack_from(self.buf, 0)
+            count = min(LAYER_COUNT.unpack_from(self.buf, LAYERS_OFF)[0], LAYER_CAP)
+            off = LAYERS_OFF + LAYER_COUNT.size
+            return version, sampled_ts, sweep_ms, [LAYER.unpack_from(self.buf, off + i * LAYER.size) for i in range(count)]
+
+        version, sampled_ts, sweep_ms, records = self._read(copy)
+        if not version:
+            return None
+        layers = [LayerReading(num, None if math.isnan(e) else e, None if math.isnan(r) else r,
+                               state_code(state.rstrip(b"\0").decode("utf-8", "replace")), ts)
+                  for e, r, ts, state, num in records]
+        return {"version": version, "layers": layers,
+                "sampled_at": str(datetime.datetime.fromtimestamp(sampled_ts)),
+                "sampled_ts": sampled_ts, "sweep_ms": sweep_ms}
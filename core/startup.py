@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+⏱️ Startup Timing
+Splits boot time into named phases so a slow cold start can be traced to
+interpreter start-up, imports, state recovery or background services.
+"""
+import os, time
+
+
+def _process_age():
+    """Seconds since this process was created (Linux /proc), else None."""
+    try:
+        with open("/proc/self/stat") as f:
+            # the command name may contain spaces; fields resume after its closing ")"
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class BootTimer:
+    def __init__(self):
+        self.before = _process_age()
+        self.started = self._last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, phase):
+        """Close the phase that ran since the previous mark."""
+        now = time.perf_counter()
+        self.phases.append((phase, round((now - self._last) * 1000, 2)))
+        self._last = now
+
+    def report(self):
+        return {"before_server_import_ms": None if self.before is None else round(self.before * 1000, 2),
+                "phases_ms": dict(self.phases),
+                "server_import_ms": round((self._last - self.started) * 1000, 2)}
+
+
+boot = BootTimer()
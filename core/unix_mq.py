@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+📨 Unix Socket Message Queue
+A python-socketio client manager that relays emits between worker
+processes on one box through Unix datagram sockets, one per worker, in
+QC_SHARED_DIR/<channel>. It is the local stand-in for a Redis message_queue.
+"""
+import os, errno, socket, atexit
+from socketio import PubSubManager
+from .fast_json import dumps_bytes
+
+MAX_DATAGRAM = 4 * 1024 * 1024
+
+
+class UnixSocketManager(PubSubManager):
+    name = "unix"
+
+    def __init__(self, directory, channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.directory = os.path.join(directory, channel)
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{self.host_id}.sock")
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        if not write_only:
+            self.sock.bind(self.path)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAX_DATAGRAM)
+            atexit.register(self._unlink)
+
+    def _unlink(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _publish(self, data):
+        payload = dumps_bytes(data)
+        for fn in os.listdir(self.directory):
+            peer = os.path.join(self.directory, fn)
+            if not fn.endswith(".sock") or peer == self.path:
+                continue
+            try:
+                self.sock.sendto(payload, peer)
+            except OSError as e:
+                if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                    # socket file left behind by a worker that exited
+                    try:
+                        os.unlink(peer)
+                    except OSError:
+                        pass
+                else:
+                    self._get_logger().warning(f"unix mq send to {fn} failed: {e}")
+
+    def _listen(self):
+        while True:
+            yield self.sock.recv(MAX_DATAGRAM)
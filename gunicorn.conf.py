@@ -0,0 +1,16 @@
+# ======================================================
+# Gunicorn config — worker class follows QC_ASYNC_MODE
+#   threading → gthread (one OS thread per open connection)
+#   gevent / eventlet → one greenlet per connection
+# ======================================================
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+# more than one worker switches the app to shared state + message queue (see README)
+workers = int(os.environ.get("QC_WORKERS", 1))
+
+_mode = os.environ.get("QC_ASYNC_MODE", "threading")
+worker_class = {"gevent": "gevent", "eventlet": "eventlet"}.get(_mode, "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 100))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 10000))
+timeout = 120
@@ -1,40 +1,152 @@
 # ======================================================
 # Quantum Core Server Pro — Render Production Edition
-# Flask + SocketIO (threading mode)
+# Flask + SocketIO (threading / gevent / eventlet via QC_ASYNC_MODE)
 # ======================================================
 
-from flask import Flask, jsonify, render_template_string, request
+import os
+from core.startup import boot
+
+# must run before anything else imports socket/threading
+ASYNC_MODE = os.environ.get("QC_ASYNC_MODE", "threading")
+if ASYNC_MODE == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE != "threading":
+    raise ValueError(f"QC_ASYNC_MODE must be threading, gevent or eventlet (got {ASYNC_MODE!r})")
+boot.mark("async_mode")
+
+from flask import Flask, g, jsonify, make_response, request
 from flask_socketio import SocketIO
-import threading, time, datetime, os, requests
+import threading, time, datetime, requests
+boot.mark("flask_imports")
+from core import fast_json, layer_engine, metrics
+from core.broadcaster import Broadcaster, full_message
+from core.core_auto_reload import start_watcher
+from core.energy_store import EnergyStore
+from core.history import History
+from core.journal import Journal
+from core.layer_snapshot import LayerSampler
+from core.layer_stats import WINDOWS as STATS_WINDOWS, LayerStats
+from core.log import get_logger
+from core.scheduler import Scheduler
+from core.shared_state import SHARED_DIR, SharedEnergyStore, make_doc, try_lead
+from core.shm_snapshot import EnergyTooLarge, ShmSnapshot, default_path as shm_default_path
+boot.mark("core_imports")
 
+# multi-worker mode: state in a shared backend, emits relayed through a message queue
+WORKERS = int(os.environ.get("QC_WORKERS", 1))
+STATE_BACKEND = os.environ.get("QC_STATE_BACKEND", "file" if WORKERS > 1 else "memory")
+MESSAGE_QUEUE = os.environ.get("QC_MESSAGE_QUEUE", "unix" if WORKERS > 1 else "")
+# single-process state is journaled to disk and recovered on restart ("" disables)
+JOURNAL_DIR = os.environ.get("QC_JOURNAL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "journal"))
+
+log = get_logger("server")
+HTTP_REQUESTS = metrics.counter("qc_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+HTTP_SECONDS = metrics.histogram("qc_http_request_duration_seconds", "HTTP request latency by route", ("route",))
+SOCKET_CLIENTS = metrics.gauge("qc_socketio_connected_clients", "Dashboards connected to this worker")
+SYNC_REQUESTS = metrics.counter("qc_sync_requests_total", "Sync ingest requests", ("kind",))
+SYNC_UPDATES = metrics.counter("qc_sync_updates_total", "Individual updates ingested (batch items counted separately)")
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+# orjson (when installed) for jsonify, request bodies and every SocketIO packet
+app.json = fast_json.FastJSONProvider(app)
+socketio_options = {"json": fast_json}
+if MESSAGE_QUEUE == "unix":
+    from core.unix_mq import UnixSocketManager
+    socketio_options["client_manager"] = UnixSocketManager(SHARED_DIR)
+elif MESSAGE_QUEUE:
+    socketio_options["message_queue"] = MESSAGE_QUEUE
+if WORKERS > 1:
+    # gunicorn has no sticky sessions, so long-polling requests would hop between workers
+    socketio_options["transports"] = ["websocket"]
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE, **socketio_options)
+broadcaster = Broadcaster(socketio)
+boot.mark("app")
 
-total_energy = {
+INITIAL_ENERGY = {
     "heaven": 3200,
     "earth": 2895,
     "human": 3010,
     "last_update": str(datetime.datetime.now())
 }
+# versioned copy-on-write store; the version keys the rendered-page cache and ETags
+# shared mode also mirrors state into a seqlock'd shared-memory segment for zero-IPC reads
+# shared backends already persist in their document, so only memory mode keeps a journal
+journal = recovered = None
+if STATE_BACKEND == "memory":
+    if JOURNAL_DIR:
+        journal = Journal(JOURNAL_DIR)
+        recovered = journal.recover(INITIAL_ENERGY)
+        energy = EnergyStore(recovered["energy"][1], version=recovered["energy"][0])
+        journal.start()
+    else:
+        energy = EnergyStore(INITIAL_ENERGY)
+    layer_doc = shm = None
+else:
+    shm = ShmSnapshot(os.environ.get("QC_SHM_PATH") or shm_default_path(SHARED_DIR))
+    energy = SharedEnergyStore(make_doc(STATE_BACKEND, "energy"), INITIAL_ENERGY, shm=shm,
+                               instance=make_doc(STATE_BACKEND, "instance"))
+    layer_doc = make_doc(STATE_BACKEND, "layers")
+# chartable history; in shared mode the rings sit next to the shm segment so all workers append/read them
+history = History(prefix=None if shm is None else os.path.splitext(shm.path)[0])
+history.energy.clear_if_ahead(energy.version)
+history.record_energy(*energy.read(), time.time())
+# running layer aggregates; the sampling leader publishes the summary for the other workers
+layer_stats = LayerStats(doc=make_doc(STATE_BACKEND, "layer_stats") if layer_doc is not None else None)
+boot.mark("state")
 
 RENDER_URL = os.environ.get("RENDER_EXTERNAL_URL", "https://quantum-core-server-full.onrender.com")
-KEEPALIVE_URL = f"{RENDER_URL.rstrip('/')}/total_energy"
+KEEPALIVE_URL = f"{RENDER_URL.rstrip('/')}/healthz"
+KEEPALIVE_INTERVAL = float(os.environ.get("KEEPALIVE_INTERVAL", 600))
+KEEPALIVE_AGENT = "quantum-core-keepalive"
+# checked twice per interval; a check skips only if the next one still lands within the interval of the last traffic
+KEEPALIVE_CHECK, KEEPALIVE_JITTER = KEEPALIVE_INTERVAL / 2, 0.1
+KEEPALIVE_SKIP = KEEPALIVE_INTERVAL - KEEPALIVE_CHECK * (1 + KEEPALIVE_JITTER)
+# platform health checks and scrapers arrive every few seconds and do not keep the instance awake
+NOT_TRAFFIC = {"healthz", "metrics_endpoint"}
 
-print(f"[INIT] KeepAlive target set to: {KEEPALIVE_URL}")
+log.info("KeepAlive target set to: %s", KEEPALIVE_URL, extra={"event": "INIT"})
+
+# one pooled connection reused across pings instead of a fresh TLS handshake every time
+keepalive_session = requests.Session()
+keepalive_session.headers["User-Agent"] = KEEPALIVE_AGENT
+keepalive_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+keepalive_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1))
+last_traffic = 0.0
 
 def keep_alive():
-    while True:
-        try:
-            r = requests.get(KEEPALIVE_URL, timeout=10)
-            if r.status_code == 200:
-                print(f"[KeepAlive ✅] Ping success → 200 OK")
-            else:
-                print(f"[KeepAlive ⚠️] Response {r.status_code}")
-        except Exception as e:
-            print(f"[KeepAlive ❌] Error: {e}")
-        time.sleep(600)
-
-threading.Thread(target=keep_alive, daemon=True).start()
+    """Ping our public URL so Render does not idle the instance; skipped when real traffic did that for us."""
+    idle = time.monotonic() - last_traffic
+    if idle < KEEPALIVE_SKIP:
+        log.debug("Skip ping, traffic %.0fs ago", idle, extra={"event": "KEEPALIVE"})
+        return False
+    if layer_doc is not None and not try_lead("keepalive"):
+        return False  # another worker pings for the instance
+    r = keepalive_session.get(KEEPALIVE_URL, timeout=10)
+    r.raise_for_status()
+    log.info("Ping success → %s", r.status_code, extra={"event": "KEEPALIVE"})
+
+# background jobs share one timer thread; names can be disabled with QC_JOBS_DISABLED
+scheduler = Scheduler()
+scheduler.add("keepalive", keep_alive, interval=KEEPALIVE_CHECK, jitter=KEEPALIVE_JITTER, retry=30)
+
+layer_sampler = LayerSampler(
+    on_sample=lambda version, changes: broadcaster.publish("quantum_sync", version, {k: r.to_dict() for k, r in changes.items()}),
+    shared=layer_doc,
+    shm=shm,
+    history=history,
+    stats=layer_stats,
+    journal=journal,
+    elect=(lambda: try_lead("layer-sampler")) if layer_doc is not None else None,
+)
+if recovered and recovered["layers"]:
+    layer_sampler.restore(recovered["layers"])
+layer_sampler.start()
+threading.Thread(target=start_watcher, kwargs={"path": layer_engine.CORE_DIR, "on_change": layer_engine.reload_layer},
+                 name="core-watcher", daemon=True).start()
+boot.mark("background")
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -59,47 +171,236 @@ HTML_TEMPLATE = """
     <hr/>
     <div class="v">Cập nhật: {{t}}</div>
   </div>
-  <footer>API JSON: /total_energy?json=1 | Sync: /sync_dashboards</footer>
+  <footer>API JSON: /total_energy?json=1 | Sync: /sync_dashboards (+ /batch)</footer>
 </body>
 </html>
 """
 
+# compiled once; pages are re-rendered only when the energy version changes
+DASHBOARD_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
+# ETag prefix: every worker must produce the same tag for a version, so shared mode uses the id stored with the document
+BOOT_ID = energy.instance_id if layer_doc is not None else format(time.time_ns(), "x")
+_page_cache = {}
+# full-state messages sent on connect/resync, encoded once per version
+_full_messages = fast_json.EncodedCache()
+
+def cached_page(kind):
+    """Return (etag, body) for the "html" or "json" dashboard at the current version."""
+    version, snap = energy.read()
+    entry = _page_cache.get(kind)
+    if entry is None or entry[0] != version:
+        if kind == "json":
+            body = fast_json.dumps_bytes({"status": "ok", "data": snap})
+        else:
+            body = DASHBOARD_TEMPLATE.render(
+                h=snap["heaven"],
+                e=snap["earth"],
+                n=snap["human"],
+                t=snap["last_update"]
+            )
+        entry = _page_cache[kind] = (version, f"{BOOT_ID}-{version}-{kind}", body)
+    return entry[1], entry[2]
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(resp):
+    global last_traffic
+    if request.endpoint not in NOT_TRAFFIC and request.user_agent.string != KEEPALIVE_AGENT:
+        last_traffic = time.monotonic()
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    HTTP_SECONDS.labels(route).observe(time.perf_counter() - g.get("started", time.perf_counter()))
+    HTTP_REQUESTS.labels(route, request.method, str(resp.status_code)).inc()
+    return resp
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# precomputed once: health probes read no shared state and allocate nothing per request
+HEALTHZ_BODY = b'{"status":"ok"}\n'
+
+@app.route("/healthz", methods=["GET", "HEAD"])
+def healthz():
+    return app.response_class(HEALTHZ_BODY, mimetype="application/json")
+
 @app.route("/")
 def index():
     return jsonify({"status": "ok", "message": "Quantum Core Server đang hoạt động"})
 
 @app.route("/total_energy", methods=["GET"])
 def dashboard():
-    total_energy["last_update"] = str(datetime.datetime.now())
-    if request.args.get("json") == "1":
-        return jsonify({"status": "ok", "data": total_energy})
-    return render_template_string(
-        HTML_TEMPLATE,
-        h=total_energy["heaven"],
-        e=total_energy["earth"],
-        n=total_energy["human"],
-        t=total_energy["last_update"]
-    )
+    kind = "json" if request.args.get("json") == "1" else "html"
+    etag, body = cached_page(kind)
+    if request.if_none_match.contains(etag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(body)
+        resp.mimetype = "application/json" if kind == "json" else "text/html"
+    resp.set_etag(etag)
+    return resp
+
+def on_commit(version, snap, changed):
+    """Fan a committed energy change out to clients, the history rings and the journal."""
+    broadcaster.publish("sync_update", version, dict(changed, last_update=snap["last_update"]))
+    history.record_energy(version, snap, time.time())
+    if journal is not None:
+        journal.append_energy(version, changed, snap["last_update"])
 
 @app.route("/sync_dashboards", methods=["POST"])
 def sync_dashboards():
     data = request.get_json(force=True, silent=True)
-    if not data:
+    if not data or not isinstance(data, dict):
         return jsonify({"status": "error", "message": "Không nhận được dữ liệu"}), 400
-    total_energy.update(data)
-    total_energy["last_update"] = str(datetime.datetime.now())
-    socketio.emit("sync_update", total_energy)
-    print(f"[SYNC] Cập nhật năng lượng: {data}")
-    return jsonify({"status": "ok", "data": total_energy}), 200
+    SYNC_REQUESTS.labels("single").inc()
+    SYNC_UPDATES.inc()
+    try:
+        version, snap, changed = energy.update(data)
+    except EnergyTooLarge as e:
+        return jsonify({"status": "error", "message": f"Dữ liệu quá lớn: {e}"}), 400
+    if not changed:
+        return jsonify({"status": "ok", "data": snap, "changed": False}), 200
+    on_commit(version, snap, changed)
+    log.info("Cập nhật năng lượng", extra={"event": "SYNC", "fields": {"version": version, "changed": changed}})
+    return jsonify({"status": "ok", "data": snap}), 200
+
+def parse_batch():
+    """Return the list of updates in a JSON array or NDJSON body, or None if malformed."""
+    body = request.get_data(as_text=True)
+    try:
+        if body.lstrip().startswith("["):
+            items = app.json.loads(body)
+        else:
+            items = [app.json.loads(line) for line in body.splitlines() if line.strip()]
+    except ValueError:
+        return None
+    return items if all(isinstance(item, dict) for item in items) else None
+
+@app.route("/sync_dashboards/batch", methods=["POST"])
+def sync_dashboards_batch():
+    updates = parse_batch()
+    if not updates:
+        return jsonify({"status": "error", "message": "Dữ liệu batch không hợp lệ (JSON array hoặc NDJSON)"}), 400
+    SYNC_REQUESTS.labels("batch").inc()
+    SYNC_UPDATES.inc(len(updates))
+    try:
+        version, snap, changed = energy.update_many(updates)
+    except EnergyTooLarge as e:
+        return jsonify({"status": "error", "message": f"Dữ liệu quá lớn: {e}"}), 400
+    if changed:
+        on_commit(version, snap, changed)
+    log.info("Batch cập nhật", extra={"event": "SYNC", "fields": {"version": version, "updates": len(updates), "changed_keys": len(changed)}})
+    return jsonify({"status": "ok", "applied": len(updates), "changed": sorted(changed), "data": snap}), 200
+
+@app.route("/layer_values", methods=["GET"])
+def layer_values():
+    snap = layer_sampler.snapshot()
+    return jsonify({"status": "ok" if not snap["stale"] else "stale", **snap, "layers": [r.to_dict() for r in snap["layers"]]})
+
+def _float_arg(name):
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    value = float(value)
+    if value != value or value in (float("inf"), float("-inf")):
+        raise ValueError(name)
+    return value
+
+@app.route("/history", methods=["GET"])
+def history_endpoint():
+    metric = request.args.get("metric")
+    if not metric:
+        return jsonify({"status": "ok", "metrics": history.metrics()})
+    try:
+        since, until, step = _float_arg("since"), _float_arg("until"), _float_arg("step")
+    except ValueError:
+        return jsonify({"status": "error", "message": "since/until/step phải là số (giây)"}), 400
+    now = time.time()
+    # negative since/until are relative to now, e.g. since=-3600 for the last hour
+    since = now + since if since is not None and since < 0 else since
+    until = now + until if until is not None and until < 0 else until
+    if step is not None and step <= 0:
+        return jsonify({"status": "error", "message": "step phải lớn hơn 0"}), 400
+    try:
+        series = history.query(metric, since, until, step)
+    except KeyError:
+        return jsonify({"status": "error", "message": f"Không có metric {metric!r}"}), 404
+    return jsonify({"status": "ok", **series})
+
+@app.route("/layer_values/<int:num>", methods=["GET"])
+def layer_value(num):
+    try:
+        reading = layer_engine.read_layer(num)
+    except KeyError:
+        return jsonify({"status": "error", "message": f"Không có layer {num}"}), 404
+    return jsonify({"status": "ok", **reading.to_dict()})
+
+@app.route("/layer_stats", methods=["GET"])
+def layer_stats_endpoint():
+    window = request.args.get("window")
+    if window is not None and window not in dict(STATS_WINDOWS):
+        return jsonify({"status": "error", "message": f"window phải là một trong {[w for w, _ in STATS_WINDOWS]}"}), 400
+    summary = layer_stats.summary()
+    if summary is None:
+        return jsonify({"status": "empty", "message": "Chưa có lượt đo layer nào"})
+    if window is not None:
+        summary = dict(summary, windows={window: summary["windows"][window]})
+    return jsonify({"status": "ok", **summary})
+
+@app.route("/admin/reload_core", methods=["GET", "POST"])
+def reload_core():
+    try:
+        overrides = layer_engine.reload_all()
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Reload thất bại: {e}"}), 500
+    return jsonify({"status": "ok", "overrides": overrides})
+
+@app.route("/admin/startup", methods=["GET"])
+def startup_report():
+    return jsonify({"status": "ok", **boot.report(), "layers": layer_engine.import_report()})
 
 @app.route("/test")
 def test():
     return jsonify({"status": "running", "time": str(datetime.datetime.now())})
 
+def emit_full(sid, streams=("sync_update", "quantum_sync")):
+    """Send full state to one client: on connect and whenever it detects a version gap."""
+    for stream in streams:
+        if stream == "sync_update":
+            version, data = energy.read()
+            build = lambda: full_message(version, data)
+        elif stream == "quantum_sync":
+            version, readings = layer_sampler.full_data()
+            # layer readings become dicts here, once per version
+            build = lambda: full_message(version, {k: r.to_dict() for k, r in readings.items()})
+        else:
+            continue
+        socketio.emit(stream, _full_messages.get(stream, version, build), to=sid)
+
 @socketio.on("connect")
 def on_connect():
-    print("[SocketIO] Client connected")
-    socketio.emit("sync_update", total_energy)
+    log.info("Client connected", extra={"event": "CONNECT"})
+    SOCKET_CLIENTS.inc()
+    emit_full(request.sid)
+
+@socketio.on("disconnect")
+def on_disconnect(*args):
+    SOCKET_CLIENTS.dec()
+
+@socketio.on("resync")
+def on_resync(data=None):
+    stream = (data or {}).get("stream") if isinstance(data, dict) else None
+    emit_full(request.sid, (stream,) if stream else ("sync_update", "quantum_sync"))
+
+layer_engine.start_pool()  # workers spawn in the background, ready before the first sweep
+boot.mark("routes")
+log.info("Boot timing", extra={"event": "BOOT", "fields": boot.report()})
+if layer_engine.LAYER_WARMUP:
+    # overrides are imported lazily; warm them once the server is up rather than during boot
+    scheduler.add("layer_warmup", layer_engine.warm_up, delay=layer_engine.LAYER_WARMUP_DELAY)
+scheduler.start()
 
 def create_app():
     """Return Flask app for Gunicorn"""
@@ -107,9 +408,9 @@ def create_app():
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 10000))
-    print(f"\n🚀 Quantum Core Server Pro (Threading) khởi động trên cổng {port}")
+    print(f"\n🚀 Quantum Core Server Pro ({ASYNC_MODE}) khởi động trên cổng {port}")
     print("🌐 Render external URL:", RENDER_URL)
     print("🔁 KeepAlive URL:", KEEPALIVE_URL)
     socketio.run(app, host="0.0.0.0", port=port, allow_unsafe_werkzeug=True)
 else:
-    print("✅ Quantum Core Server loaded by Gunicorn (production mode)")
\ No newline at end of file
+    log.info("Quantum Core Server loaded by Gunicorn (production mode)", extra={"event": "INIT"})
\ No newline at end of file